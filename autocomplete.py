@@ -0,0 +1,157 @@
+# autocomplete.py
+import heapq
+import logging
+from bisect import bisect_left, insort
+from threading import RLock
+
+from text_normalizer import normalize_text, tokenize
+
+logger = logging.getLogger(__name__)
+
+MAX_PREFIX_LENGTH = 3   # Shu uzunlikkacha bo'lgan prefikslar uchun natijalar oldindan hisoblanadi
+TOP_K = 50              # Har bir prefiks uchun saqlanadigan eng ko'p ko'rilgan kinolar soni
+
+
+class TitleAutocomplete:
+    """
+    Kino nomlaridagi so'zlarning prefikslari bo'yicha avtoto'ldirish.
+    So'zlar tartiblangan massivda (bisect bilan qidiriladi), 1-3 harfli prefikslar uchun esa
+    eng ko'p ko'rilgan TOP_K kino oldindan tayyorlab qo'yiladi - bunday so'rovlar eng ko'p
+    uchraydi va LIKE '%q%' uchun eng qimmat.
+    """
+
+    def __init__(self, top_k: int = TOP_K, max_prefix_length: int = MAX_PREFIX_LENGTH):
+        self.top_k = top_k
+        self.max_prefix_length = max_prefix_length
+        self.lock = RLock()
+        self._ready = False
+        self._tokens = {}       # {so'z: set(movie_id)}
+        self._vocabulary = []   # Tartiblangan so'zlar
+        self._doc_tokens = {}   # {movie_id: set(so'zlar)}
+        self._views = {}        # {movie_id: views}
+        self._top = {}          # {qisqa_prefiks: [movie_id, ...]} - views bo'yicha kamayish tartibida
+
+    def is_ready(self):
+        return self._ready
+
+    def build(self, movies):
+        with self.lock:
+            self._tokens.clear()
+            self._doc_tokens.clear()
+            self._views.clear()
+            for movie in movies:
+                self._index_movie(movie)
+            self._vocabulary = sorted(self._tokens)
+            self._top = {}
+            for prefix in {token[:length] for token in self._vocabulary for length in range(1, self.max_prefix_length + 1)}:
+                self._top[prefix] = self._compute_top(prefix)
+            self._ready = True
+        logger.info(f"Avtoto'ldirish indeksi qurildi: {len(self._vocabulary)} so'z, {len(self._top)} prefiks")
+
+    def add(self, movie):
+        with self.lock:
+            self._remove_movie(movie.id)
+            for token in self._index_movie(movie):
+                insort(self._vocabulary, token)
+            for prefix in self._short_prefixes(movie.id):
+                self._offer(prefix, movie.id)
+
+    def remove(self, movie_id: int):
+        with self.lock:
+            self._remove_movie(movie_id)
+
+    def increment_views(self, movie_id: int, delta: int = 1):
+        with self.lock:
+            if movie_id not in self._views:
+                return
+            self._views[movie_id] += delta
+            for prefix in self._short_prefixes(movie_id):
+                self._offer(prefix, movie_id)
+
+    def complete(self, prefix: str, limit: int = TOP_K):
+        """
+        prefix bilan boshlanadigan so'zi bor eng ko'p ko'rilgan kinolar ID lari.
+        Bir nechta so'zli so'rov yoki mos so'z topilmasa None (chaqiruvchi oddiy qidiruvga o'tadi).
+        """
+        prefix = normalize_text(prefix)
+        if not prefix or ' ' in prefix:
+            return None
+        with self.lock:
+            if len(prefix) <= self.max_prefix_length:
+                movie_ids = self._top.get(prefix, [])[:limit]
+            else:
+                movie_ids = self._compute_top(prefix, limit)
+        return movie_ids or None
+
+    # --- Ichki yordamchi funksiyalar ---
+
+    def _index_movie(self, movie):
+        tokens = set(tokenize(movie.title)) | set(tokenize(movie.original_title))
+        new_tokens = []
+        for token in tokens:
+            movie_ids = self._tokens.get(token)
+            if movie_ids is None:
+                movie_ids = self._tokens[token] = set()
+                new_tokens.append(token)
+            movie_ids.add(movie.id)
+        self._doc_tokens[movie.id] = tokens
+        self._views[movie.id] = movie.views or 0
+        return new_tokens
+
+    def _remove_movie(self, movie_id: int):
+        tokens = self._doc_tokens.pop(movie_id, None)
+        if tokens is None:
+            return
+        affected = {token[:length] for token in tokens for length in range(1, self.max_prefix_length + 1)}
+        for token in tokens:
+            movie_ids = self._tokens.get(token)
+            if movie_ids is None:
+                continue
+            movie_ids.discard(movie_id)
+            if not movie_ids:
+                del self._tokens[token]
+                position = bisect_left(self._vocabulary, token)
+                if position < len(self._vocabulary) and self._vocabulary[position] == token:
+                    del self._vocabulary[position]
+        self._views.pop(movie_id, None)
+        # O'chirilgan kino o'rnini keyingi nomzod egallashi uchun faqat u bor ro'yxatlar qayta hisoblanadi
+        for prefix in affected:
+            if movie_id in self._top.get(prefix, ()):
+                top = self._compute_top(prefix)
+                if top:
+                    self._top[prefix] = top
+                else:
+                    self._top.pop(prefix, None)
+
+    def _short_prefixes(self, movie_id: int):
+        return {
+            token[:length]
+            for token in self._doc_tokens.get(movie_id, ())
+            for length in range(1, self.max_prefix_length + 1)
+            if len(token) >= length
+        }
+
+    def _offer(self, prefix: str, movie_id: int):
+        """Kinoni prefiks ro'yxatiga (agar munosib bo'lsa) joylashtirish"""
+        top = self._top.setdefault(prefix, [])
+        if movie_id in top:
+            top.remove(movie_id)
+        elif len(top) >= self.top_k and self._rank(top[-1]) >= self._rank(movie_id):
+            return
+        position = 0
+        rank = self._rank(movie_id)
+        while position < len(top) and self._rank(top[position]) > rank:
+            position += 1
+        top.insert(position, movie_id)
+        del top[self.top_k:]
+
+    def _rank(self, movie_id: int):
+        return (self._views.get(movie_id, 0), movie_id)
+
+    def _compute_top(self, prefix: str, limit: int = None):
+        movie_ids = set()
+        position = bisect_left(self._vocabulary, prefix)
+        while position < len(self._vocabulary) and self._vocabulary[position].startswith(prefix):
+            movie_ids |= self._tokens[self._vocabulary[position]]
+            position += 1
+        return heapq.nlargest(limit or self.top_k, movie_ids, key=self._rank)
@@ -0,0 +1,379 @@
+# benchmark.py
+"""
+Qidiruv va katalog funksiyalari uchun yuklama o'lchovi.
+
+Sun'iy katalog (o'zbekcha/inglizcha nomlar, real janr taqsimoti) yaratib, MovieManager ning
+o'qish funksiyalarini parallel ishga tushiradi va har bir amal uchun o'tkazuvchanlik hamda
+p50/p95/p99 kechikishlarini JSON ko'rinishida chiqaradi.
+
+Misollar:
+    python benchmark.py --sizes 1000,10000 --output bench.json
+    python benchmark.py --database-url postgresql://localhost/kino_bench --sizes 100000 --backends sql
+    python benchmark.py --sizes 10000 --baseline bench.json   # oldingi natija bilan solishtirish
+
+DIQQAT: tanlangan bazadagi kinolar jadvallari tozalanadi. Bot bazasida ishga tushirmang.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+DEFAULT_DATABASE_URL = "sqlite:///benchmark.db"
+INSERT_BATCH_SIZE = 5000
+
+# --- Sun'iy katalog uchun lug'atlar ---
+
+UZBEK_WORDS = [
+    "sevgi", "qasos", "yo'l", "tun", "kun", "yurak", "ona", "ota", "do'st", "dushman", "shahar",
+    "qishloq", "oltin", "qora", "oq", "qizil", "bahor", "kuz", "qish", "yoz", "tog'", "daryo",
+    "dengiz", "osmon", "yulduz", "oy", "quyosh", "sirli", "so'nggi", "birinchi", "yangi", "eski",
+    "jang", "o'yin", "orzu", "baxt", "hayot", "taqdir", "vatan", "qahramon", "shoh", "malika",
+    "bo'ri", "sher", "burgut", "otliq", "sarguzasht", "ishq", "sadoqat", "xiyonat", "qaytish", "uy",
+]
+ENGLISH_WORDS = [
+    "love", "revenge", "road", "night", "day", "heart", "mother", "father", "friend", "enemy", "city",
+    "village", "gold", "black", "white", "red", "spring", "autumn", "winter", "summer", "mountain",
+    "river", "sea", "sky", "star", "moon", "sun", "secret", "last", "first", "new", "old", "battle",
+    "game", "dream", "happiness", "life", "destiny", "home", "hero", "king", "queen", "wolf", "lion",
+    "eagle", "rider", "adventure", "passion", "loyalty", "betrayal", "return", "shadow", "storm",
+]
+CYRILLIC_TITLES = [
+    "Ўтган кунлар", "Шум бола", "Қасоскорлар", "Тунги шаҳар", "Севги йўли", "Сўнгги жанг",
+    "Олтин водий", "Қора булут", "Ёшлик", "Мафия", "Брат", "Бриллиантовая рука", "Экипаж",
+]
+TITLE_PATTERNS = ["{a}", "{a} {b}", "{a} {b} {c}", "{a}: {b} {c}", "{a} va {b}", "{a} {b} {n}"]
+
+# TMDB janrlari va ularning katalogdagi taxminiy ulushi
+GENRE_WEIGHTS = {
+    "Drama": 30, "Comedy": 18, "Action": 16, "Thriller": 12, "Romance": 10, "Crime": 9,
+    "Adventure": 8, "Horror": 7, "Science Fiction": 6, "Fantasy": 5, "Animation": 5, "Family": 5,
+    "Mystery": 4, "History": 3, "War": 2, "Documentary": 2, "Music": 1, "Western": 1, "TV Movie": 1,
+}
+
+OPERATIONS = [
+    "search_exact", "search_prefix", "search_short", "search_typo", "search_cyrillic",
+    "search_by_id", "latest_movies", "top_movies", "all_genres", "movies_by_genre", "deliver_movie",
+]
+
+# --- Katalog generatori ---
+
+def make_title(rng: random.Random, words):
+    pattern = rng.choice(TITLE_PATTERNS)
+    a, b, c = rng.sample(words, 3)
+    title = pattern.format(a=a, b=b, c=c, n=rng.randint(2, 5))
+    return title[0].upper() + title[1:]
+
+def generate_catalog(size: int, seed: int):
+    """Takrorlanadigan (seed bo'yicha) sun'iy kinolar ro'yxati"""
+    rng = random.Random(seed)
+    genre_names = list(GENRE_WEIGHTS)
+    genre_weights = list(GENRE_WEIGHTS.values())
+    start_date = datetime(2022, 1, 1)
+    movies = []
+    for movie_id in range(1, size + 1):
+        roll = rng.random()
+        if roll < 0.45:
+            title = make_title(rng, UZBEK_WORDS)
+            original_title = make_title(rng, ENGLISH_WORDS) if rng.random() < 0.6 else None
+        elif roll < 0.9:
+            title = make_title(rng, ENGLISH_WORDS)
+            original_title = None
+        else:
+            title = f"{rng.choice(CYRILLIC_TITLES)} {rng.randint(1, 9)}" if rng.random() < 0.5 else rng.choice(CYRILLIC_TITLES)
+            original_title = make_title(rng, ENGLISH_WORDS) if rng.random() < 0.3 else None
+        genres = []
+        while len(genres) < rng.choice((1, 1, 2, 2, 3)):
+            genre = rng.choices(genre_names, weights=genre_weights)[0]
+            if genre not in genres:
+                genres.append(genre)
+        movies.append({
+            "id": movie_id,
+            "file_id": f"bench_{seed}_{movie_id}",
+            "title": title,
+            "original_title": original_title,
+            "year": str(rng.randint(1970, 2025)),
+            "rating": round(rng.uniform(3.0, 9.5), 1),
+            "genres": ", ".join(genres),
+            # Ko'rishlar soni "uzun dum"li: ozchilik kinolar ko'p ko'riladi
+            "views": int(rng.paretovariate(1.2)) - 1,
+            "added_date": start_date + timedelta(minutes=rng.randint(0, 3 * 365 * 24 * 60)),
+        })
+    return movies
+
+def populate_database(movies, force: bool = False):
+    """Kinolar va janr bog'lanishlarini bazaga yozish (avvalgi katalog o'chiriladi)"""
+    from sqlalchemy import text
+    from database import engine, SessionLocal, Movie, Genre, MovieGenre, User
+    from text_normalizer import build_search_key, split_genres
+
+    with SessionLocal() as db:
+        if not force and db.query(User.user_id).first() is not None:
+            raise SystemExit("Bazada foydalanuvchilar bor - bu bot bazasiga o'xshaydi. Davom etish uchun --force qo'shing.")
+        db.query(MovieGenre).delete(synchronize_session=False)
+        db.query(Genre).delete(synchronize_session=False)
+        db.query(Movie).delete(synchronize_session=False)
+        db.commit()
+
+        genre_ids = {}
+        for genre_id, name in enumerate(GENRE_WEIGHTS, start=1):
+            db.add(Genre(id=genre_id, name=name))
+            genre_ids[name] = genre_id
+        db.commit()
+
+        for start in range(0, len(movies), INSERT_BATCH_SIZE):
+            batch = movies[start:start + INSERT_BATCH_SIZE]
+            db.bulk_insert_mappings(Movie, [
+                dict(movie, search_key=build_search_key(movie["title"], movie["original_title"]))
+                for movie in batch
+            ])
+            db.bulk_insert_mappings(MovieGenre, [
+                {"movie_id": movie["id"], "genre_id": genre_ids[name]}
+                for movie in batch for name in split_genres(movie["genres"])
+            ])
+            db.commit()
+
+    if engine.dialect.name == "postgresql":
+        # ID lar qo'lda berilgani uchun ketma-ketliklarni surib qo'yamiz va statistikani yangilaymiz
+        with engine.begin() as conn:
+            conn.execute(text("SELECT setval(pg_get_serial_sequence('movies', 'id'), (SELECT MAX(id) FROM movies))"))
+            conn.execute(text("SELECT setval(pg_get_serial_sequence('genres', 'id'), (SELECT MAX(id) FROM genres))"))
+            conn.execute(text("ANALYZE movies"))
+            conn.execute(text("ANALYZE movie_genres"))
+            conn.execute(text("ANALYZE genres"))
+
+# --- So'rovlar to'plami ---
+
+def make_typo(rng: random.Random, word: str):
+    if len(word) < 4:
+        return word
+    position = rng.randrange(1, len(word) - 1)
+    action = rng.choice(("swap", "drop", "replace"))
+    if action == "swap":
+        return word[:position] + word[position + 1] + word[position] + word[position + 2:]
+    if action == "drop":
+        return word[:position] + word[position + 1:]
+    return word[:position] + rng.choice("aeiou") + word[position + 1:]
+
+def build_workload(movies, operation: str, count: int, seed: int):
+    """Amal uchun tasodifiy argumentlar ro'yxati (katalogdagi haqiqiy nomlardan)"""
+    rng = random.Random(f"{seed}:{operation}")
+    sample = [rng.choice(movies) for _ in range(count)]
+    if operation == "search_exact":
+        return [movie["title"] for movie in sample]
+    if operation == "search_prefix":
+        return [movie["title"].split()[0][:rng.randint(4, 6)] for movie in sample]
+    if operation == "search_short":
+        return [movie["title"][:rng.randint(1, 3)] for movie in sample]
+    if operation == "search_typo":
+        return [make_typo(rng, max(movie["title"].split(), key=len)) for movie in sample]
+    if operation == "search_cyrillic":
+        return [rng.choice(CYRILLIC_TITLES).split()[0] for _ in range(count)]
+    if operation == "search_by_id":
+        return [str(movie["id"]) for movie in sample]
+    if operation == "deliver_movie":
+        return [(movie["id"], rng.randint(1, 100000)) for movie in sample]
+    if operation == "movies_by_genre":
+        return rng.choices(list(GENRE_WEIGHTS), weights=list(GENRE_WEIGHTS.values()), k=count)
+    return [None] * count
+
+def make_call(movie_manager, operation: str, limit: int):
+    """Amal nomidan MovieManager chaqiruviga (main.py dagi kabi argumentlar bilan)"""
+    if operation.startswith("search_"):
+        def call(query):
+            if operation == "search_short":
+                movies = movie_manager.autocomplete_movies(query, limit)
+                if movies is not None:
+                    return movies
+            return movie_manager.search_movies(query, limit=limit)
+        return call
+    if operation == "latest_movies":
+        return lambda _: movie_manager.get_latest_movies(limit=10)
+    if operation == "top_movies":
+        return lambda _: movie_manager.get_top_movies(limit=10)
+    if operation == "all_genres":
+        return lambda _: movie_manager.get_all_genres()
+    if operation == "movies_by_genre":
+        return lambda genre: movie_manager.get_movies_by_genre(genre, limit=10)
+    if operation == "deliver_movie":
+        # send_movie dagi yagona so'rov (kino + sevimlilar belgisi)
+        return lambda pair: movie_manager.get_movie_for_delivery(*pair)
+    raise ValueError(f"Noma'lum amal: {operation}")
+
+# --- O'lchash ---
+
+def percentile(sorted_values, fraction: float):
+    """Eng yaqin rang (nearest-rank) usulidagi persentil"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(fraction * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def run_operation(call, arguments, concurrency: int):
+    """Argumentlarni concurrency ta oqimda bajarib, kechikishlar statistikasini qaytaradi"""
+    def timed(argument):
+        started = time.perf_counter()
+        try:
+            call(argument)
+            ok = True
+        except Exception:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(timed, arguments))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency * 1000 for latency, _ in samples)
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, ok in samples if not ok),
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "max_ms": round(latencies[-1], 3) if latencies else 0.0,
+    }
+
+def benchmark_size(size: int, args):
+    from database import engine
+    from movie_manager import MovieManager
+
+    report = {"size": size, "setup": {}, "results": []}
+    started = time.perf_counter()
+    movies = generate_catalog(size, args.seed)
+    report["setup"]["generate_s"] = round(time.perf_counter() - started, 3)
+
+    started = time.perf_counter()
+    populate_database(movies, force=args.force)
+    report["setup"]["populate_s"] = round(time.perf_counter() - started, 3)
+    log(f"[{size}] katalog tayyor ({engine.dialect.name}): {report['setup']}")
+
+    for backend in args.backends:
+        movie_manager = MovieManager(search_backend=backend)
+        if not args.with_cache:
+            # Natijalar keshi o'chiriladi, aks holda takroriy so'rovlar xom tezlikni yashiradi
+            movie_manager.search_cache.maxsize = 0
+        started = time.perf_counter()
+        movie_manager.load_catalog()
+        report["setup"][f"load_catalog_{backend}_s"] = round(time.perf_counter() - started, 3)
+
+        for operation in args.operations:
+            call = make_call(movie_manager, operation, args.limit)
+            # Isitish: birinchi chaqiruvlardagi ulanish va kesh xarajatlari natijaga kirmaydi
+            for argument in build_workload(movies, operation, args.warmup, args.seed + 1):
+                call(argument)
+            stats = run_operation(call, build_workload(movies, operation, args.requests, args.seed), args.concurrency)
+            report["results"].append({"backend": backend, "operation": operation, **stats})
+            log(f"[{size}/{backend}] {operation}: {stats['throughput_rps']} rps, "
+                f"p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms p99={stats['p99_ms']}ms")
+    return report
+
+def compare_with_baseline(report, baseline_path: str):
+    """Oldingi natija bilan p95 va o'tkazuvchanlik farqlarini (nisbat sifatida) hisoblash"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {
+        (run["size"], result["backend"], result["operation"]): result
+        for run in baseline.get("runs", []) for result in run["results"]
+    }
+    comparison = []
+    for run in report["runs"]:
+        for result in run["results"]:
+            old = previous.get((run["size"], result["backend"], result["operation"]))
+            if not old:
+                continue
+            comparison.append({
+                "size": run["size"],
+                "backend": result["backend"],
+                "operation": result["operation"],
+                "p95_ratio": round(result["p95_ms"] / old["p95_ms"], 3) if old["p95_ms"] else None,
+                "throughput_ratio": round(result["throughput_rps"] / old["throughput_rps"], 3) if old["throughput_rps"] else None,
+            })
+    return comparison
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+def log(message: str):
+    # Natija JSON stdout ga chiqishi mumkin, shuning uchun jarayon haqidagi xabarlar stderr ga
+    print(message, file=sys.stderr, flush=True)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Qidiruv va katalog funksiyalari uchun benchmark")
+    parser.add_argument("--database-url", default=os.getenv("BENCHMARK_DATABASE_URL", DEFAULT_DATABASE_URL))
+    parser.add_argument("--sizes", default="1000,10000", help="Katalog hajmlari, masalan 1000,10000,100000,1000000")
+    parser.add_argument("--backends", default="memory,sql", help="SEARCH_BACKEND qiymatlari")
+    parser.add_argument("--operations", default=",".join(OPERATIONS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=2000, help="Har bir amal uchun so'rovlar soni")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=50, help="Inline qidiruvdagi natijalar soni")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--with-cache", action="store_true", help="Qidiruv natijalari keshini yoqilgan holda o'lchash")
+    parser.add_argument("--force", action="store_true", help="Bazada foydalanuvchilar bo'lsa ham katalogni qayta yozish")
+    parser.add_argument("--output", help="JSON natija fayli (ko'rsatilmasa stdout)")
+    parser.add_argument("--baseline", help="Solishtirish uchun oldingi JSON natija")
+    args = parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(",") if size]
+    args.backends = [backend.strip() for backend in args.backends.split(",") if backend.strip()]
+    args.operations = [operation.strip() for operation in args.operations.split(",") if operation.strip()]
+    unknown = set(args.operations) - set(OPERATIONS)
+    if unknown:
+        parser.error(f"Noma'lum amallar: {', '.join(sorted(unknown))}")
+    return args
+
+def main():
+    args = parse_args()
+    # database.py import paytida DATABASE_URL ni o'qiydi, shuning uchun loyiha modullaridan oldin
+    os.environ["DATABASE_URL"] = args.database_url
+
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+    from database import init_db, engine
+    with contextlib.redirect_stdout(sys.stderr):
+        init_db()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "git_revision": git_revision(),
+            "database": engine.dialect.name,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "concurrency": args.concurrency,
+            "requests_per_operation": args.requests,
+            "limit": args.limit,
+            "seed": args.seed,
+            "search_cache": args.with_cache,
+        },
+        "runs": [benchmark_size(size, args) for size in args.sizes],
+    }
+    if args.baseline:
+        report["comparison"] = compare_with_baseline(report, args.baseline)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        log(f"Natijalar {args.output} fayliga yozildi.")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,136 @@
 # broadcast_manager.py
 import logging
+import os
+import socket
 import time
-from datetime import datetime
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
 from threading import Thread, Lock
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
+from sqlalchemy import desc, func, or_
+from telebot import types
+from telebot.apihelper import ApiTelegramException
 from database import Broadcast, SessionLocal
+from config import (
+    BROADCAST_RATE, BROADCAST_WORKERS, BROADCAST_MAX_RETRIES, BROADCAST_RETRY_DELAY, BROADCAST_PROGRESS_INTERVAL,
+    BROADCAST_CHECKPOINT_INTERVAL, BROADCAST_LEASE_TTL
+)
 
 logger = logging.getLogger(__name__)
 
+# Bitta qabul qiluvchi uchun vaqtinchalik xatoliklardagi kutishlar yig'indisi (1 + 2 + 4 + ... marta BROADCAST_RETRY_DELAY)
+BROADCAST_BACKOFF_TOTAL = BROADCAST_RETRY_DELAY * (2 ** BROADCAST_MAX_RETRIES - 1)
+
+class TokenBucket:
+    """
+    Barcha broadcastlar uchun umumiy tezlik chegarasi (thread-safe).
+    429 kelganda retry_after davomida to'xtaydi va tezlikni pasaytiradi, muvaffaqiyatli yuborishlar bilan asta-sekin tiklaydi.
+    """
+
+    def __init__(self, rate: float, min_rate: float = 1.0):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.capacity = max(1.0, rate / 5) # Ko'pi bilan ~200ms lik to'plam birdaniga
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.successes = 0
+        self.lock = Lock()
+
+    def acquire(self, is_cancelled=lambda: False):
+        """Bitta ruxsat olinguncha kutish; bekor qilinsa False"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return True
+                    delay = (1 - self.tokens) / self.rate
+            if is_cancelled():
+                return False
+            time.sleep(min(delay, 1.0))
+
+    def penalize(self, retry_after: float):
+        with self.lock:
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + retry_after)
+            self.rate = max(self.min_rate, self.rate * 0.7)
+            self.capacity = max(1.0, self.rate / 5)
+            self.tokens = 0.0
+            self.updated = self.paused_until
+            self.successes = 0
+
+    def reward(self):
+        with self.lock:
+            self.successes += 1
+            # Har ~1 soniyalik muvaffaqiyatli yuborishdan keyin tezlik 1 ga oshadi (maksimumgacha)
+            if self.rate < self.max_rate and self.successes >= self.rate:
+                self.rate = min(self.max_rate, self.rate + 1)
+                self.capacity = max(1.0, self.rate / 5)
+                self.successes = 0
+
+class DeliveryCursor:
+    """
+    Qabul qiluvchilar (user_id bo'yicha tartiblangan) ustidagi yuborish kursori.
+    Oqimlar tartibsiz tugatgani uchun ikki qismdan iborat: cursor_user_id - undan kichik/teng barcha
+    qabul qiluvchilar tugagan; ahead - kursordan keyin allaqachon tugaganlar (oqimlar soni bilan cheklangan oyna).
+    delivered_ahead - oldingi ishga tushishdan qolgan ahead: kursor ulardan o'tmaguncha har checkpointda saqlanadi.
+    """
+
+    def __init__(self, recipients, cursor_user_id=None, delivered_ahead=()):
+        self.recipients = recipients
+        self.cursor_user_id = cursor_user_id
+        self._carried = sorted(delivered_ahead)
+        self._next = 0      # Keyingi beriladigan qabul qiluvchi indeksi
+        self._low = 0       # Shu indeksdan oldingilarning hammasi tugagan
+        self._finished = set()
+        self.lock = Lock()
+
+    def take(self):
+        """Keyingi qabul qiluvchi (index, user_id) yoki None"""
+        with self.lock:
+            if self._next >= len(self.recipients):
+                return None
+            index = self._next
+            self._next += 1
+            return index, self.recipients[index]
+
+    def finish(self, index: int):
+        with self.lock:
+            self._finished.add(index)
+            while self._low in self._finished:
+                self._finished.remove(self._low)
+                self.cursor_user_id = self.recipients[self._low]
+                self._low += 1
+
+    def checkpoint(self):
+        """(cursor_user_id, kursordan keyin tugaganlar) - bazaga yoziladi"""
+        with self.lock:
+            ahead = {self.recipients[index] for index in self._finished}
+            ahead.update(user_id for user_id in self._carried
+                         if self.cursor_user_id is None or user_id > self.cursor_user_id)
+            return self.cursor_user_id, sorted(ahead)
+
+
 class BroadcastManager:
     def __init__(self):
-        self.active_broadcasts = {} # {broadcast_id: {"cancelled": False}}
+        self.active_broadcasts = {} # {broadcast_id: {"cancelled": False, "success": 0, "failed": 0, ...}}
         self.lock = Lock()
+        self.rate_limiter = TokenBucket(BROADCAST_RATE)
+        # Broadcast qatorlarini egallash uchun shu jarayonning identifikatori (lease egasi)
+        self.owner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stopping = False
+        self._resumer_thread = None
 
-    def start_broadcast(self, bot, user_list, content, admin_id):
+    def start_broadcast(self, bot, user_list, content, admin_id, on_progress=None):
+        """on_progress(progress) - har BROADCAST_PROGRESS_INTERVAL soniyada va oxirida chaqiriladi"""
         # Content preview yaratish. Buni baza operatsiyasidan oldin qilamiz.
         try:
             content_type = content.content_type
@@ -29,6 +145,8 @@ class BroadcastManager:
             content_type = content.content_type or "unknown"
 
         broadcast_id = int(time.time() * 1000)
+        recipients = sorted(user_list) # ID bo'yicha tartib - kursor shu tartibda siljiydi
+        reply_markup = content.reply_markup.to_json() if content.reply_markup else None
 
         with SessionLocal() as db:
             try:
@@ -37,8 +155,15 @@ class BroadcastManager:
                     admin_id=admin_id,
                     content_type=content_type,
                     content_preview=preview,
-                    total_users=len(user_list),
-                    status="running"  # Statusni "pending" yoki "starting" qilsa ham bo'ladi
+                    total_users=len(recipients),
+                    status="running",  # Statusni "pending" yoki "starting" qilsa ham bo'ladi
+                    # Qayta ishga tushganda davom ettirish uchun kerakli ma'lumotlar
+                    content_chat_id=content.chat.id,
+                    content_message_id=content.message_id,
+                    content_reply_markup=reply_markup,
+                    max_user_id=recipients[-1] if recipients else None,
+                    owner=self.owner_id,
+                    lease_expires=datetime.utcnow() + timedelta(seconds=BROADCAST_LEASE_TTL)
                 )
                 db.add(new_broadcast)
                 db.commit()
@@ -48,57 +173,311 @@ class BroadcastManager:
                 return None # Agar bazaga saqlay olmasak, jarayonni boshlamaymiz.
 
         # Faqat bazaga muvaffaqiyatli yozilgandan keyingina jarayonni boshlaymiz
+        self._launch(bot, broadcast_id, DeliveryCursor(recipients), len(recipients), 0, 0,
+                     (content.chat.id, content.message_id, content.reply_markup), on_progress)
+        logger.info(f"Broadcast boshlandi: ID {broadcast_id}, {len(recipients)} foydalanuvchi")
+        return broadcast_id
+
+    def resume_broadcasts(self, bot, get_recipients, on_progress_factory=None):
+        """
+        "running" holatida qolgan va hech bir jarayon egallamagan (yoki lease muddati o'tgan) broadcastlarni
+        kursordan davom ettirish. Har bir qator avval shartli UPDATE bilan egallanadi - bir nechta jarayon
+        bo'lsa ham bitta broadcastni faqat bittasi yuboradi.
+        get_recipients(after_user_id, max_user_id, joined_before) - qabul qiluvchilar: broadcast boshlanganda bazada
+        bo'lgan foydalanuvchilar (keyin qo'shilganlar kirmaydi); ban/premium holati esa hozirgisi olinadi.
+        on_progress_factory(broadcast) - shu broadcast uchun on_progress funksiyasi (yoki None).
+        """
+        if self._stopping:
+            return []
+        with SessionLocal() as db:
+            try:
+                broadcast_ids = [broadcast_id for (broadcast_id,) in db.query(Broadcast.id).filter(
+                    Broadcast.status == "running", self._claimable()
+                ).all()]
+            except Exception as e:
+                logger.error(f"Tugallanmagan broadcastlarni olishda xatolik: {e}")
+                return []
+
+        resumed = []
+        for broadcast_id in broadcast_ids:
+            with self.lock:
+                if broadcast_id in self.active_broadcasts:
+                    continue
+            broadcast = self._claim(broadcast_id)
+            if broadcast is None:
+                continue # Boshqa jarayon egalladi
+            if broadcast.content_chat_id is None or broadcast.content_message_id is None:
+                # Kursor ustunlaridan oldin boshlangan - davom ettirib bo'lmaydi
+                self._finish_status(broadcast.id, "interrupted")
+                continue
+
+            delivered_ahead = {int(user_id) for user_id in (broadcast.delivered_ahead or "").split(",") if user_id}
+            recipients = [
+                user_id for user_id in get_recipients(broadcast.cursor_user_id, broadcast.max_user_id, broadcast.start_time)
+                if user_id not in delivered_ahead
+            ]
+            reply_markup = types.InlineKeyboardMarkup.de_json(broadcast.content_reply_markup) if broadcast.content_reply_markup else None
+            success, failed = broadcast.success_count or 0, broadcast.failed_count or 0
+            # Jami: allaqachon tugaganlar + qolganlar (premium/ban holati o'zgargan bo'lishi mumkin)
+            total = success + failed + len(recipients)
+            on_progress = on_progress_factory(broadcast) if on_progress_factory else None
+
+            cursor = DeliveryCursor(recipients, broadcast.cursor_user_id, delivered_ahead)
+            self._launch(bot, broadcast.id, cursor, total, success, failed,
+                         (broadcast.content_chat_id, broadcast.content_message_id, reply_markup), on_progress)
+            logger.info(f"Broadcast davom ettirildi: ID {broadcast.id}, qolgan {len(recipients)} foydalanuvchi")
+            resumed.append(broadcast.id)
+        return resumed
+
+    def start_broadcast_resumer(self, bot, get_recipients, on_progress_factory=None, interval: float = BROADCAST_LEASE_TTL):
+        """resume_broadcasts ni darhol va har interval soniyada chaqiruvchi fon oqimi (to'xtagan jarayonlarning broadcastlari uchun)"""
+        if self._resumer_thread is not None or interval <= 0:
+            return
+
+        def resume_loop():
+            while not self._stopping:
+                self.resume_broadcasts(bot, get_recipients, on_progress_factory)
+                time.sleep(interval)
+
+        self._resumer_thread = Thread(target=resume_loop, name="broadcast-resumer", daemon=True)
+        self._resumer_thread.start()
+
+    def suspend_all(self):
+        """
+        Jarayon to'xtashidan oldin: barcha broadcastlarni to'xtatib, kursorni saqlash va lease ni bo'shatish
+        (status "running" qoladi - boshqa yoki keyingi jarayon davom ettiradi)
+        """
         with self.lock:
-            self.active_broadcasts[broadcast_id] = {"cancelled": False}
+            self._stopping = True
+            states = list(self.active_broadcasts.values())
+            for state in states:
+                state["suspended"] = True
+        for state in states:
+            state["thread"].join(timeout=BROADCAST_BACKOFF_TOTAL + 5) # + ayni paytdagi so'rov uchun zaxira
+
+    def _claimable(self):
+        # O'zimizning qatorlar ham faqat lease muddati o'tgach egallanadi: aks holda start_broadcast commit qilgan,
+        # lekin hali active_broadcasts ga qo'shilmagan broadcastni resumer ikkinchi marta ishga tushirishi mumkin
+        return or_(Broadcast.owner.is_(None), Broadcast.lease_expires < datetime.utcnow())
+
+    def _claim(self, broadcast_id):
+        """Broadcast qatorini shu jarayon uchun egallash; yutilsa yangilangan qatorni, aks holda None qaytaradi"""
+        with SessionLocal() as db:
+            try:
+                claimed = db.query(Broadcast).filter(
+                    Broadcast.id == broadcast_id, Broadcast.status == "running", self._claimable()
+                ).update(
+                    {Broadcast.owner: self.owner_id,
+                     Broadcast.lease_expires: datetime.utcnow() + timedelta(seconds=BROADCAST_LEASE_TTL)},
+                    synchronize_session=False
+                )
+                db.commit()
+                # Kursor egallangandan keyin o'qiladi - oldingi egasining oxirgi checkpointi bilan
+                return db.get(Broadcast, broadcast_id, populate_existing=True) if claimed else None
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Broadcastni egallashda xatolik: {e}")
+                return None
 
-        thread = Thread(
-            target=self._send_broadcast_messages,
-            args=(bot, broadcast_id, user_list, content)
-        )
-        thread.daemon = True
+    def _launch(self, bot, broadcast_id, cursor, total, success, failed, message, on_progress):
+        with self.lock:
+            self.active_broadcasts[broadcast_id] = {
+                # To'xtash boshlangan bo'lsa darhol to'xtatiladi - yakuniy checkpoint lease ni bo'shatadi
+                "cancelled": False, "suspended": self._stopping, "lost": False, "success": success, "failed": failed,
+                "total": total, "started_at": time.monotonic(), "done_at_start": success + failed,
+                "cursor": cursor, "message": message,
+            }
+            thread = Thread(
+                target=self._send_broadcast_messages,
+                args=(bot, broadcast_id, on_progress),
+                name=f"broadcast-{broadcast_id}"
+            )
+            thread.daemon = True
+            self.active_broadcasts[broadcast_id]["thread"] = thread
         thread.start()
 
-        logger.info(f"Broadcast boshlandi: ID {broadcast_id}, {len(user_list)} foydalanuvchi")
-        return broadcast_id
-    def _send_broadcast_messages(self, bot, broadcast_id, user_list, content):
-        success_count = 0
-        failed_count = 0
+    def _send_broadcast_messages(self, bot, broadcast_id, on_progress=None):
+        """
+        Qabul qiluvchilar BROADCAST_WORKERS ta oqim orasida taqsimlanadi, har bir yuborish esa
+        umumiy token bucket dan ruxsat oladi. Bekor qilish active_broadcasts dagi "cancelled" orqali.
+        Kursor har BROADCAST_CHECKPOINT_INTERVAL soniyada bazaga yoziladi va lease uzaytiriladi;
+        qator boshqa jarayonga o'tgan yoki boshqa joyda bekor qilingan bo'lsa ("lost") yuborish to'xtaydi.
+        """
+        state = self.active_broadcasts[broadcast_id]
+        cursor = state["cursor"]
+        is_stopped = lambda: state["cancelled"] or state["suspended"] or state["lost"]
 
-        for user_id in user_list:
-            with self.lock:
-                if self.active_broadcasts.get(broadcast_id, {}).get("cancelled"):
-                    logger.info(f"Broadcast bekor qilindi: {broadcast_id}")
+        def worker():
+            while not is_stopped():
+                item = cursor.take()
+                if item is None:
+                    return
+                index, user_id = item
+                delivered = self._deliver(bot, state, user_id, is_stopped)
+                if delivered is None:
+                    return # To'xtatildi - bu qabul qiluvchi tugallanmagan, kursor undan oldin qoladi
+                with self.lock:
+                    state["success" if delivered else "failed"] += 1
+                cursor.finish(index)
+
+        last_progress = time.monotonic()
+        with ThreadPoolExecutor(max_workers=BROADCAST_WORKERS, thread_name_prefix=f"broadcast-{broadcast_id}") as pool:
+            workers = [pool.submit(worker) for _ in range(BROADCAST_WORKERS)]
+            while True:
+                done, pending = wait(workers, timeout=BROADCAST_CHECKPOINT_INTERVAL)
+                if not pending:
                     break
+                self._checkpoint(broadcast_id)
+                if time.monotonic() - last_progress >= BROADCAST_PROGRESS_INTERVAL:
+                    last_progress = time.monotonic()
+                    self._report_progress(broadcast_id, on_progress)
+
+        self._checkpoint(broadcast_id, release=state["suspended"])
+        if state["suspended"] or state["lost"]:
+            # Jarayon to'xtamoqda (status "running" qoladi, lease bo'shatildi) yoki qator endi bizniki emas
+            with self.lock:
+                self.active_broadcasts.pop(broadcast_id, None)
+            logger.info(f"Broadcast shu jarayonda to'xtatildi ({'suspended' if state['suspended'] else 'lost'}): {broadcast_id}")
+            return
+        if state["cancelled"]:
+            logger.info(f"Broadcast bekor qilindi: {broadcast_id}")
+        self._report_progress(broadcast_id, on_progress)
+        self._complete_broadcast(broadcast_id, state["success"], state["failed"])
+
+    def _deliver(self, bot, state, user_id, is_stopped):
+        """
+        Bitta qabul qiluvchiga yuborish: True - yuborildi, False - yuborib bo'lmadi, None - to'xtatildi.
+        Faqat 5xx va tarmoq xatoliklari BROADCAST_MAX_RETRIES ga hisoblanadi; 429 da token bucket da
+        retry_after kutiladi va broadcast to'xtatilmaguncha qayta uriniladi.
+        """
+        from_chat_id, message_id, reply_markup = state["message"]
+        attempt = 0
+        while True:
+            if not self.rate_limiter.acquire(is_stopped):
+                return None
             try:
-                bot.copy_message(user_id, content.chat.id, content.message_id, reply_markup=content.reply_markup)
-                success_count += 1
+                bot.copy_message(user_id, from_chat_id, message_id, reply_markup=reply_markup)
+                self.rate_limiter.reward()
+                return True
+            except ApiTelegramException as e:
+                if e.error_code == 429:
+                    # Flood limit: barcha oqimlar retry_after soniya to'xtaydi, tezlik esa pasaytiriladi
+                    retry_after = (e.result_json or {}).get("parameters", {}).get("retry_after", 1)
+                    self.rate_limiter.penalize(retry_after)
+                    logger.warning(f"Broadcast 429: {retry_after} soniya kutiladi, yangi tezlik {self.rate_limiter.rate:.1f}/s")
+                    continue
+                if e.error_code < 500:
+                    # Bloklangan, o'chirilgan akkaunt, chat topilmadi - qayta urinish befoyda
+                    logger.debug(f"Foydalanuvchiga ({user_id}) xabar yuborishda xatolik: {e}")
+                    return False
+                error = e
             except Exception as e:
-                failed_count += 1
-                logger.debug(f"Foydalanuvchiga ({user_id}) xabar yuborishda xatolik: {e}")
+                error = e # Tarmoq xatoligi
+            if attempt >= BROADCAST_MAX_RETRIES:
+                logger.debug(f"Foydalanuvchiga ({user_id}) yuborib bo'lmadi ({attempt + 1} urinish): {error}")
+                return False
+            logger.debug(f"Foydalanuvchiga ({user_id}) yuborishda vaqtinchalik xatolik (urinish {attempt + 1}): {error}")
+            if not self._backoff(BROADCAST_RETRY_DELAY * 2 ** attempt, is_stopped):
+                return None
+            attempt += 1
 
-            time.sleep(0.05) # 50ms
+    @staticmethod
+    def _backoff(delay: float, is_stopped):
+        """delay soniya kutish (1 soniyalik qadamlar bilan); to'xtatilsa False"""
+        deadline = time.monotonic() + delay
+        while True:
+            if is_stopped():
+                return False
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            time.sleep(min(remaining, 1.0))
 
-            if (success_count + failed_count) % 100 == 0:
-                self._update_broadcast_progress(broadcast_id, success_count, failed_count)
+    def get_broadcast_progress(self, broadcast_id):
+        """Faol broadcast holati: yuborilgan/xato/jami, o'rtacha tezlik va qolgan vaqt"""
+        with self.lock:
+            state = self.active_broadcasts.get(broadcast_id)
+            if state is None:
+                return None
+            success, failed, total = state["success"], state["failed"], state["total"]
+            elapsed = time.monotonic() - state["started_at"]
+            done_now = success + failed - state["done_at_start"] # Davom ettirilganda - faqat shu ishga tushishdagilar
+        done = success + failed
+        rate = done_now / elapsed if elapsed > 0 else 0.0
+        return {
+            "broadcast_id": broadcast_id,
+            "total": total,
+            "success": success,
+            "failed": failed,
+            "rate": rate,
+            "limit": self.rate_limiter.rate,
+            "eta_s": (total - done) / rate if rate else None,
+            "cancelled": state["cancelled"],
+        }
 
-        self._complete_broadcast(broadcast_id, success_count, failed_count)
+    def _report_progress(self, broadcast_id, on_progress):
+        progress = self.get_broadcast_progress(broadcast_id)
+        if progress is None or not on_progress:
+            return
+        try:
+            on_progress(progress)
+        except Exception as e:
+            logger.error(f"Broadcast holatini yuborishda xatolik: {e}")
 
-    def _update_broadcast_progress(self, broadcast_id, success, failed):
+    def _checkpoint(self, broadcast_id, release: bool = False):
+        """Hisoblagichlar va yuborish kursorini bazaga yozish; release - lease ni bo'shatish (to'xtashda)"""
+        with self.lock:
+            state = self.active_broadcasts.get(broadcast_id)
+            if state is None:
+                return
+            success, failed = state["success"], state["failed"]
+        cursor_user_id, delivered_ahead = state["cursor"].checkpoint()
+        updated = self._update_broadcast_progress(broadcast_id, success, failed, cursor_user_id, delivered_ahead, release)
+        if updated is False and not state["cancelled"]:
+            logger.warning(f"Broadcast endi shu jarayonga tegishli emas (lease yo'qotildi yoki bekor qilindi): {broadcast_id}")
+            state["lost"] = True
+
+    def _update_broadcast_progress(self, broadcast_id, success, failed, cursor_user_id=None, delivered_ahead=(), release=False):
+        """
+        Faqat shu jarayon egallagan "running" qatorni yangilaydi va lease ni uzaytiradi.
+        True - yangilandi, False - qator bizniki emas, None - baza xatoligi (lease muddati hali tugamagan bo'lishi mumkin)
+        """
         with SessionLocal() as db:
             try:
                 # Bu yerda to'liq obyektni olish o'rniga to'g'ridan-to'g'ri UPDATE so'rovini bajaramiz.
                 # Bu "SELECT, keyin UPDATE" qilishdan ko'ra ancha tezroq, chunki bazaga bitta so'rov yuboriladi.
-                db.query(Broadcast).filter(Broadcast.id == broadcast_id).update(
+                updated = db.query(Broadcast).filter(
+                    Broadcast.id == broadcast_id, Broadcast.status == "running", Broadcast.owner == self.owner_id
+                ).update(
                     {
                         Broadcast.success_count: success,
-                        Broadcast.failed_count: failed
+                        Broadcast.failed_count: failed,
+                        Broadcast.cursor_user_id: cursor_user_id,
+                        Broadcast.delivered_ahead: ",".join(map(str, delivered_ahead)) or None,
+                        Broadcast.owner: None if release else self.owner_id,
+                        Broadcast.lease_expires: None if release else datetime.utcnow() + timedelta(seconds=BROADCAST_LEASE_TTL)
                     },
                     synchronize_session=False # Muhim: sessiyani yangilashga vaqt sarflamaymiz
                 )
                 db.commit()
+                return updated > 0
             except Exception as e:
                 db.rollback()
                 logger.error(f"Progress yangilashda xatolik: {e}")
+                return None
+
+    def _finish_status(self, broadcast_id, status):
+        with SessionLocal() as db:
+            try:
+                db.query(Broadcast).filter(Broadcast.id == broadcast_id).update(
+                    {Broadcast.status: status, Broadcast.end_time: datetime.utcnow()},
+                    synchronize_session=False
+                )
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Broadcast holatini yangilashda xatolik: {e}")
+
     def _complete_broadcast(self, broadcast_id, success, failed):
         with SessionLocal() as db:
             try:
@@ -110,6 +489,7 @@ class BroadcastManager:
                     broadcast.success_count = success
                     broadcast.failed_count = failed
                     broadcast.end_time = datetime.utcnow()
+                    broadcast.owner = None
 
                     # Agar broadcast bekor qilinmagan bo'lsa, "completed" deb belgilaymiz.
                     # `broadcast.status` allaqachon "cancelled" bo'lishi mumkin (cancel_broadcast orqali).
@@ -0,0 +1,165 @@
+# catalog_views.py
+import heapq
+import logging
+from datetime import datetime
+from threading import RLock
+
+from text_normalizer import split_genres
+
+logger = logging.getLogger(__name__)
+
+LIST_SIZE = 50  # Har bir ro'yxatda saqlanadigan kinolar soni (menyu 10 tasini ko'rsatadi)
+
+
+class RankedList:
+    """Kalit bo'yicha kamayish tartibida saqlanadigan cheklangan (top-N) ro'yxat"""
+
+    def __init__(self, size: int, key):
+        self.size = size
+        self.key = key
+        self.ids = []
+
+    def rebuild(self, movie_ids):
+        self.ids = heapq.nlargest(self.size, movie_ids, key=self.key)
+
+    def offer(self, movie_id: int):
+        """Kinoni (kaliti o'zgargan bo'lsa ham) ro'yxatdagi to'g'ri joyiga qo'yish"""
+        if movie_id in self.ids:
+            self.ids.remove(movie_id)
+        elif len(self.ids) >= self.size and self.key(self.ids[-1]) >= self.key(movie_id):
+            return
+        rank = self.key(movie_id)
+        position = 0
+        while position < len(self.ids) and self.key(self.ids[position]) > rank:
+            position += 1
+        self.ids.insert(position, movie_id)
+        del self.ids[self.size:]
+
+    def discard(self, movie_id: int):
+        """Ro'yxatda bo'lsa olib tashlaydi va True qaytaradi (bo'sh joyni to'ldirish chaqiruvchida)"""
+        if movie_id in self.ids:
+            self.ids.remove(movie_id)
+            return True
+        return False
+
+
+class CatalogViews:
+    """
+    Menyu ro'yxatlarining xotiradagi "materialized view" lari:
+    eng ko'p ko'rilganlar, eng yangilari va har bir janr bo'yicha top-N.
+    Ko'rishlar, qo'shish va o'chirishda qisman yangilanadi, davriy ravishda bazadan qayta quriladi.
+    """
+
+    def __init__(self, size: int = LIST_SIZE):
+        self.size = size
+        self.lock = RLock()
+        self._ready = False
+        self._movies = {}        # {movie_id: Movie}
+        self._views = {}         # {movie_id: views} - Movie obyektlari boshqa indekslar bilan umumiy bo'lishi mumkin
+        self._movie_genres = {}  # {movie_id: [janrlar]}
+        self._genre_members = {} # {janr: set(movie_id)}
+        self._sorted_genres = []
+        self._top = RankedList(size, self._popularity_key)
+        self._latest = RankedList(size, self._latest_key)
+        self._genre_top = {}     # {janr: RankedList}
+
+    def is_ready(self):
+        return self._ready
+
+    def build(self, movies):
+        """Barcha ro'yxatlarni noldan qurish (ishga tushganda va davriy moslashtirishda)"""
+        with self.lock:
+            self._movies = {}
+            self._views = {}
+            self._movie_genres = {}
+            self._genre_members = {}
+            for movie in movies:
+                self._store(movie)
+            self._top.rebuild(self._movies)
+            self._latest.rebuild(self._movies)
+            self._genre_top = {}
+            for genre, members in self._genre_members.items():
+                self._genre_top[genre] = RankedList(self.size, self._popularity_key)
+                self._genre_top[genre].rebuild(members)
+            self._sorted_genres = sorted(self._genre_members)
+            self._ready = True
+        logger.info(f"Katalog ro'yxatlari qurildi: {len(self._movies)} film, {len(self._genre_members)} janr")
+
+    def add(self, movie):
+        with self.lock:
+            self._remove(movie.id)
+            self._store(movie)
+            self._top.offer(movie.id)
+            self._latest.offer(movie.id)
+            for genre in self._movie_genres[movie.id]:
+                if genre not in self._genre_top:
+                    self._genre_top[genre] = RankedList(self.size, self._popularity_key)
+                self._genre_top[genre].offer(movie.id)
+            self._sorted_genres = sorted(self._genre_members)
+
+    def remove(self, movie_id: int):
+        with self.lock:
+            self._remove(movie_id)
+            self._sorted_genres = sorted(self._genre_members)
+
+    def increment_views(self, movie_id: int, delta: int = 1):
+        with self.lock:
+            if movie_id not in self._views:
+                return
+            self._views[movie_id] += delta
+            self._top.offer(movie_id)
+            for genre in self._movie_genres.get(movie_id, ()):
+                self._genre_top[genre].offer(movie_id)
+
+    def top(self, limit: int):
+        with self.lock:
+            return [self._movies[movie_id] for movie_id in self._top.ids[:limit]]
+
+    def latest(self, limit: int):
+        with self.lock:
+            return [self._movies[movie_id] for movie_id in self._latest.ids[:limit]]
+
+    def genres(self):
+        return list(self._sorted_genres)
+
+    def by_genre(self, genre: str, limit: int):
+        with self.lock:
+            ranked = self._genre_top.get(genre)
+            return [self._movies[movie_id] for movie_id in ranked.ids[:limit]] if ranked else []
+
+    # --- Ichki yordamchi funksiyalar ---
+
+    def _popularity_key(self, movie_id: int):
+        return (self._views.get(movie_id, 0), movie_id)
+
+    def _latest_key(self, movie_id: int):
+        return (self._movies[movie_id].added_date or datetime.min, movie_id)
+
+    def _store(self, movie):
+        genres = split_genres(movie.genres)
+        self._movies[movie.id] = movie
+        self._views[movie.id] = movie.views or 0
+        self._movie_genres[movie.id] = genres
+        for genre in genres:
+            self._genre_members.setdefault(genre, set()).add(movie.id)
+
+    def _remove(self, movie_id: int):
+        if movie_id not in self._movies:
+            return
+        # Ro'yxatdan chiqqan kino o'rniga keyingisi kelishi uchun shu ro'yxat qayta quriladi
+        if self._top.discard(movie_id):
+            self._top.rebuild(movie for movie in self._movies if movie != movie_id)
+        if self._latest.discard(movie_id):
+            self._latest.rebuild(movie for movie in self._movies if movie != movie_id)
+        for genre in self._movie_genres.pop(movie_id, ()):
+            members = self._genre_members.get(genre)
+            if members is None:
+                continue
+            members.discard(movie_id)
+            if not members:
+                del self._genre_members[genre]
+                self._genre_top.pop(genre, None)
+            elif self._genre_top[genre].discard(movie_id):
+                self._genre_top[genre].rebuild(members)
+        del self._movies[movie_id]
+        self._views.pop(movie_id, None)
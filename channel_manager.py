@@ -1,19 +1,127 @@
 # channel_manager.py
 import logging
 import json
+from datetime import datetime, timedelta
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from database import Channel, Settings, SessionLocal
+from database import Channel, ChannelMember, Settings, SessionLocal
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.dialects.postgresql import insert # Fayl boshiga qo'shing
+from ttl_cache import TTLCache
+from settings_cache import settings_cache
+from config import (
+    MEMBERSHIP_CACHE_SIZE, MEMBERSHIP_CACHE_TTL_POSITIVE, MEMBERSHIP_CACHE_TTL_NEGATIVE, MEMBERSHIP_RECORD_MAX_AGE,
+    GATE_SETTINGS_CACHE_TTL
+)
 
 
 logger = logging.getLogger(__name__)
 
+MEMBER_STATUSES = ('member', 'administrator', 'creator')
+
+def is_active_member(chat_member):
+    """get_chat_member / chat_member yangilanishidagi holat kanal a'zoligini bildiradimi"""
+    if chat_member.status == 'restricted':
+        return bool(getattr(chat_member, 'is_member', False))
+    return chat_member.status in MEMBER_STATUSES
+
 class ChannelManager:
     def __init__(self):
         self._init_settings()
+        # {(user_id, kanal_username): a'zo_yoki_yo'q} - har bir murojaatda Telegram API ga bormaslik uchun.
+        # A'zo bo'lmaganlar qisqaroq saqlanadi, chunki ular obuna bo'lib darhol qaytadi.
+        self.membership_cache = TTLCache(maxsize=MEMBERSHIP_CACHE_SIZE, ttl=MEMBERSHIP_CACHE_TTL_POSITIVE)
+        # Faol kanallar - har bir so'rovda kerak, lekin kamdan-kam o'zgaradi
+        self.active_channels_cache = TTLCache(maxsize=1, ttl=GATE_SETTINGS_CACHE_TTL)
+
+    def get_gate_settings(self):
+        """(majburiy a'zolik yoqilganmi, faol kanallar ro'yxati) - keshdan"""
+        channels = self.active_channels_cache.get("channels")
+        if channels is None:
+            channels = self.get_channel_list_for_check()
+            self.active_channels_cache.set("channels", channels)
+        return self.is_membership_required(), channels
+
+    def get_cached_membership(self, user_id: int, channel_username: str):
+        """Keshdagi a'zolik holati: True/False yoki (keshda bo'lmasa) None"""
+        return self.membership_cache.get((user_id, channel_username))
+
+    def cache_membership(self, user_id: int, channel_username: str, is_member: bool):
+        ttl = MEMBERSHIP_CACHE_TTL_POSITIVE if is_member else MEMBERSHIP_CACHE_TTL_NEGATIVE
+        self.membership_cache.set((user_id, channel_username), is_member, ttl=ttl)
+
+    def invalidate_membership(self, user_id: int):
+        """Foydalanuvchining barcha kanallar bo'yicha saqlangan holatini o'chirish ("Obunani tekshirish" bosilganda)"""
+        usernames = [channel.username for channel in self.get_channel_list_for_check()]
+        for username in usernames:
+            self.membership_cache.invalidate((user_id, username))
+        if not usernames:
+            return
+        with SessionLocal() as db:
+            try:
+                db.query(ChannelMember).filter(
+                    ChannelMember.user_id == user_id,
+                    ChannelMember.channel_username.in_(usernames)
+                ).delete(synchronize_session=False)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"A'zolik yozuvlarini o'chirishda xatolik: {e}")
+
+    def get_stored_memberships(self, user_id: int, channel_usernames):
+        """channel_members jadvalidagi eskirmagan yozuvlar: {kanal_username: a'zo_yoki_yo'q}"""
+        if not channel_usernames:
+            return {}
+        fresh_after = datetime.utcnow() - timedelta(hours=MEMBERSHIP_RECORD_MAX_AGE)
+        with SessionLocal() as db:
+            try:
+                rows = db.query(ChannelMember.channel_username, ChannelMember.is_member).filter(
+                    ChannelMember.user_id == user_id,
+                    ChannelMember.channel_username.in_(channel_usernames),
+                    ChannelMember.updated_at >= fresh_after
+                ).all()
+                return {username: is_member for username, is_member in rows}
+            except Exception as e:
+                logger.error(f"A'zolik yozuvlarini olishda xatolik: {e}")
+                return {}
+
+    def save_membership(self, user_id: int, channel_username: str, is_member: bool):
+        """A'zolik holatini keshga va channel_members jadvaliga yozish"""
+        self.cache_membership(user_id, channel_username, is_member)
+        with SessionLocal() as db:
+            try:
+                db.merge(ChannelMember(
+                    channel_username=channel_username,
+                    user_id=user_id,
+                    is_member=is_member,
+                    updated_at=datetime.utcnow()
+                ))
+                db.commit()
+            except IntegrityError:
+                # Boshqa oqim shu yozuvni bir vaqtda qo'shdi - uning qiymati ham yangi
+                db.rollback()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"A'zolik holatini saqlashda xatolik: {e}")
 
+    def record_member_update(self, chat_username: str, user_id: int, is_member: bool):
+        """chat_member yangilanishini qayd etish (faqat botga qo'shilgan kanallar uchun)"""
+        with SessionLocal() as db:
+            try:
+                # Telegram username katta-kichik harfni farqlamaydi, jadvaldagi yozilishini olamiz
+                channel_username = db.query(Channel.username).filter(
+                    func.lower(Channel.username) == chat_username.lower()
+                ).scalar()
+            except Exception as e:
+                logger.error(f"Kanalni aniqlashda xatolik: {e}")
+                return False
+        if not channel_username:
+            return False
+        self.save_membership(user_id, channel_username, is_member)
+        return True
 
+    def get_membership_cache_stats(self):
+        return self.membership_cache.stats()
 
     def _init_settings(self):
         """Boshlang'ich sozlamalarni yaratish (agar mavjud bo'lmasa)"""
@@ -36,6 +144,7 @@ class ChannelManager:
                 # result.rowcount > 0 bo'lsa, demak yangi yozuv qo'shildi.
                 if result.rowcount > 0:
                     logger.info("check_membership sozlamasi yaratildi.")
+                    settings_cache.reload()
 
             except Exception as e:
                 db.rollback()
@@ -64,6 +173,8 @@ class ChannelManager:
                 )
                 db.add(new_channel)
                 db.commit()
+                self.membership_cache.clear()
+                self.active_channels_cache.clear()
                 logger.info(f"Kanal qo'shildi: {username}")
                 return True, f"✅ Kanal (@{username}) muvaffaqiyatli qo'shildi!"
 
@@ -86,7 +197,12 @@ class ChannelManager:
                 deleted_rows = db.query(Channel).filter(Channel.username == username).delete(
                     synchronize_session=False
                 )
+                db.query(ChannelMember).filter(ChannelMember.channel_username == username).delete(
+                    synchronize_session=False
+                )
                 db.commit()
+                self.membership_cache.clear()
+                self.active_channels_cache.clear()
 
                 if deleted_rows > 0:
                     logger.info(f"Kanal o'chirildi: {username}")
@@ -127,6 +243,8 @@ class ChannelManager:
                 new_status_bool = channel.is_active
 
                 db.commit()
+                self.membership_cache.clear()
+                self.active_channels_cache.clear()
 
                 status_text = "✅ Faollashtirildi" if new_status_bool else "❌ Nofaollashtirildi"
                 logger.info(f"Kanal holati o'zgartirildi: {username} - {status_text}")
@@ -145,23 +263,14 @@ class ChannelManager:
                 logger.error(f"Tekshirish uchun aktiv kanallar ro'yxatini olishda xatolik: {e}")
                 return []
     def is_membership_required(self):
-        with SessionLocal() as db:
-            try:
-                # .with_entities() faqat kerakli "value" ustunini oladi, bu tezroq.
-                # .scalar() esa natijani to'g'ridan-to'g'ri (masalan, 'true') yoki None qaytaradi.
-                setting_value = db.query(Settings.value).filter(Settings.key == "check_membership").scalar()
+        # Sozlamalar keshidan - har bir so'rovda bazaga murojaat qilinmaydi
+        setting_value = settings_cache.get("check_membership")
 
-                # Agar sozlama topilmasa (None), standart holat "true" bo'ladi.
-                if setting_value is None:
-                    return True
+        # Agar sozlama topilmasa (None), standart holat "true" bo'ladi.
+        if setting_value is None:
+            return True
 
-                # Topilgan qiymatni tekshiramiz.
-                return setting_value.lower() == 'true'
-
-            except Exception as e:
-                logger.error(f"A'zolik tekshiruvi sozlamasini olishda xatolik: {e}")
-                # Xatolik yuz bersa, xavfsizlik uchun a'zolik talab qilinadi deb hisoblaymiz.
-                return True
+        return setting_value.lower() == 'true'
 
 # channel_manager.py faylidagi FAQAT SHU FUNKSIYANI almashtiring
 
@@ -182,7 +291,9 @@ class ChannelManager:
                 current_status = setting.value.lower() == 'true'
                 new_status = not current_status
                 setting.value = str(new_status).lower()
+                settings_cache.bump_version(db)
                 db.commit()
+                settings_cache.reload()
 
                 status_text = "✅ Yoqildi" if new_status else "❌ O'chirildi"
                 logger.info(f"A'zolik tekshiruvi {status_text}")
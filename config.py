@@ -28,6 +28,93 @@ PAYMENT_CARD_INFO = {
     'bank_name': 'Uzcard'
 }
 
+# Qidiruv tizimi: "memory" - xotiradagi indeks, "sql" - to'g'ridan-to'g'ri ma'lumotlar bazasi
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "memory").lower()
+
+# Qidiruv natijalari keshi (bot ichida)
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2048"))
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "60"))  # soniya
+
+# Kino caption va tugmalari keshi (kino ID -> tayyor qismlar); kino o'zgarsa yoki o'chirilsa yangilanadi
+MOVIE_RENDER_CACHE_SIZE = int(os.getenv("MOVIE_RENDER_CACHE_SIZE", "5000"))
+MOVIE_RENDER_CACHE_TTL = int(os.getenv("MOVIE_RENDER_CACHE_TTL", "3600"))  # soniya
+
+# Kanal a'zoligi keshi: (foydalanuvchi, kanal) juftligi uchun get_chat_member natijasi
+MEMBERSHIP_CACHE_SIZE = int(os.getenv("MEMBERSHIP_CACHE_SIZE", "50000"))
+MEMBERSHIP_CACHE_TTL_POSITIVE = int(os.getenv("MEMBERSHIP_CACHE_TTL_POSITIVE", "600"))  # A'zo - soniya
+MEMBERSHIP_CACHE_TTL_NEGATIVE = int(os.getenv("MEMBERSHIP_CACHE_TTL_NEGATIVE", "30"))   # A'zo emas - soniya
+
+# channel_members jadvalidagi yozuv shuncha soatdan keyin get_chat_member orqali qayta tekshiriladi
+# (bot kanalda admin bo'lmasa chat_member yangilanishlari kelmaydi)
+MEMBERSHIP_RECORD_MAX_AGE = int(os.getenv("MEMBERSHIP_RECORD_MAX_AGE", "24"))
+
+# Faol kanallar ro'yxati keshi (boshqa jarayonlardagi o'zgarishlar shu vaqtda ko'rinadi)
+GATE_SETTINGS_CACHE_TTL = int(os.getenv("GATE_SETTINGS_CACHE_TTL", "30"))  # soniya
+
+# settings jadvali keshi: boshqa jarayon o'zgartirganini bilish uchun versiya shu oraliqda tekshiriladi
+SETTINGS_VERSION_CHECK_INTERVAL = float(os.getenv("SETTINGS_VERSION_CHECK_INTERVAL", "5"))  # soniya
+
+# Keshda yo'q kanallar get_chat_member orqali parallel tekshiriladi (umumiy oqimlar havzasi)
+MEMBERSHIP_CHECK_WORKERS = int(os.getenv("MEMBERSHIP_CHECK_WORKERS", "16"))
+MEMBERSHIP_CHECK_TIMEOUT = float(os.getenv("MEMBERSHIP_CHECK_TIMEOUT", "3"))  # soniya
+
+# Ban holati keshi (foydalanuvchi -> is_banned). Ban bot tashqarisida (bazada) o'rnatiladi va keshni hech narsa
+# bekor qilmaydi: yangi ban qilingan foydalanuvchi BAN_CACHE_TTL soniyagacha botdan foydalana oladi (0 - keshsiz)
+BAN_CACHE_SIZE = int(os.getenv("BAN_CACHE_SIZE", "100000"))
+BAN_CACHE_TTL = int(os.getenv("BAN_CACHE_TTL", "300"))  # soniya
+
+# Foydalanuvchi upsertlari navbati: shuncha soniyada yoki shuncha yozuv yig'ilganda bitta so'rov bilan yoziladi
+USER_FLUSH_INTERVAL = float(os.getenv("USER_FLUSH_INTERVAL", "5"))  # soniya (0 - fon oqimi o'chirilgan)
+USER_FLUSH_MAX_PENDING = int(os.getenv("USER_FLUSH_MAX_PENDING", "500"))
+USER_WRITE_CHUNK_SIZE = int(os.getenv("USER_WRITE_CHUNK_SIZE", "1000"))  # Bitta INSERT dagi qatorlar (bind parametrlar chegarasi)
+USER_PENDING_LIMIT = int(os.getenv("USER_PENDING_LIMIT", "100000"))  # Xatolikdan keyin navbatga qaytariladigan yozuvlar chegarasi
+
+# Ko'rishlar va tomoshalar hisoblagichlari shu oraliqda bitta bulk UPDATE bilan yoziladi (soniya, 0 - o'chirilgan)
+COUNTER_FLUSH_INTERVAL = float(os.getenv("COUNTER_FLUSH_INTERVAL", "10"))
+
+# Ko'rishlar jurnali (watch_events): navbat hajmi, bitta COPY dagi yozuvlar soni va yozish oralig'i
+WATCH_LOG_QUEUE_SIZE = int(os.getenv("WATCH_LOG_QUEUE_SIZE", "100000"))
+WATCH_LOG_BATCH_SIZE = int(os.getenv("WATCH_LOG_BATCH_SIZE", "5000"))
+WATCH_LOG_FLUSH_INTERVAL = float(os.getenv("WATCH_LOG_FLUSH_INTERVAL", "2"))  # soniya (0 - fon oqimi o'chirilgan)
+
+# Premium holati keshi: foydalanuvchi -> obuna tugash vaqti (boshqa jarayonlardagi to'lovlar TTL dan keyin ko'rinadi)
+PREMIUM_CACHE_SIZE = int(os.getenv("PREMIUM_CACHE_SIZE", "100000"))
+PREMIUM_CACHE_TTL = int(os.getenv("PREMIUM_CACHE_TTL", "300"))  # soniya
+# Muddati tugagan obunalarni bitta UPDATE bilan o'chirish oralig'i (soniya, 0 - o'chirilgan)
+PREMIUM_SWEEP_INTERVAL = int(os.getenv("PREMIUM_SWEEP_INTERVAL", "600"))
+
+# Xotiradagi qidiruv indekslari va menyu ro'yxatlarini bazadan qayta qurish oralig'i (soniya, 0 - o'chirilgan).
+# Boshqa jarayonda qo'shilgan/o'chirilgan kinolar shu oraliqda ko'rinadi.
+CATALOG_RECONCILE_INTERVAL = int(os.getenv("CATALOG_RECONCILE_INTERVAL", "600"))
+
+# Ommaviy xabar: umumiy tezlik chegarasi (Telegram ~30 xabar/soniya), parallel oqimlar va qayta urinishlar
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "28"))  # xabar/soniya
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "8"))
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "3"))  # Vaqtinchalik xatoliklarda bitta qabul qiluvchiga
+BROADCAST_RETRY_DELAY = float(os.getenv("BROADCAST_RETRY_DELAY", "1"))  # soniya, har urinishda ikki barobar
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "10"))  # soniya
+# Yuborish kursori bazaga shu oraliqda yoziladi (halokatli to'xtashda ko'pi bilan shuncha soniyalik xabar qayta yuboriladi)
+BROADCAST_CHECKPOINT_INTERVAL = float(os.getenv("BROADCAST_CHECKPOINT_INTERVAL", "2"))  # soniya
+# Broadcastni yuborayotgan jarayon lease i shuncha soniya amal qiladi (har checkpointda uzaytiriladi);
+# muddati o'tgan "running" broadcastlarni boshqa jarayon shu oraliqda tekshirib davom ettiradi
+BROADCAST_LEASE_TTL = float(os.getenv("BROADCAST_LEASE_TTL", "30"))  # soniya
+
+# Botning o'z chatidagi inline qidiruvda a'zo/premium foydalanuvchilarga video natijalar (InlineQueryResultCachedVideo)
+# qaytariladi - tanlanganda video bir qadamda yuboriladi. Ko'rishlarni hisoblash uchun BotFather da /setinlinefeedback yoqilishi kerak.
+# DIQQAT: inline natijalarda protect_content yo'q - bu yo'l bilan yuborilgan videolarni forward qilish va saqlash mumkin
+# (send_movie esa doim protect_content=True bilan yuboradi). Shuning uchun sukut bo'yicha o'chirilgan: /start havolalari qaytariladi.
+INLINE_VIDEO_RESULTS = os.getenv("INLINE_VIDEO_RESULTS", "0") == "1"
+
+# Foydalanuvchi sevimlilari (kino ID lari to'plami) keshi - inline video tugmalari uchun
+FAVORITES_CACHE_SIZE = int(os.getenv("FAVORITES_CACHE_SIZE", "20000"))
+FAVORITES_CACHE_TTL = int(os.getenv("FAVORITES_CACHE_TTL", "300"))  # soniya
+
+# Telegram tomonidagi inline natijalar keshi (cache_time, soniya)
+INLINE_CACHE_TIME = {
+    'empty': int(os.getenv("INLINE_CACHE_TIME_EMPTY", "60")),  # Bo'sh so'rov (eng yangi kinolar)
+    'text': int(os.getenv("INLINE_CACHE_TIME_TEXT", "5")),     # Matnli qidiruv
+}
+
 # Fayl yo'llari
 DATA_DIR = "data"
 # MOVIES_DATA_FILE = os.path.join(DATA_DIR, "movies.json")
@@ -0,0 +1,60 @@
+# counter_buffer.py
+from threading import Lock
+
+from sqlalchemy import Integer, BigInteger, column, func, update, values
+
+
+class CounterBuffer:
+    """
+    Hisoblagichlar (ko'rishlar, tomoshalar) uchun xotiradagi o'zgarishlar yig'uvchisi (thread-safe).
+    Har bir kalit bo'yicha delta yig'iladi va davriy ravishda bitta bulk UPDATE bilan bazaga yoziladi.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self._deltas = {}  # {kalit: delta}
+
+    def add(self, key, delta: int = 1):
+        with self.lock:
+            self._deltas[key] = self._deltas.get(key, 0) + delta
+
+    def pending(self, key):
+        """Hali bazaga yozilmagan delta (ko'rsatiladigan qiymatga qo'shish uchun)"""
+        return self._deltas.get(key, 0)
+
+    def pending_items(self):
+        with self.lock:
+            return dict(self._deltas)
+
+    def __len__(self):
+        return len(self._deltas)
+
+    def drain(self):
+        """Yig'ilgan deltalarni olib, buferni bo'shatish"""
+        with self.lock:
+            batch, self._deltas = self._deltas, {}
+        return batch
+
+    def restore(self, batch: dict):
+        """Yozib bo'lmagan deltalarni qaytarish (shu orada qo'shilganlari bilan jamlanadi)"""
+        with self.lock:
+            for key, delta in batch.items():
+                self._deltas[key] = self._deltas.get(key, 0) + delta
+
+
+def bulk_increment(db, model, key_column, counter_column, deltas: dict):
+    """
+    UPDATE <jadval> SET <ustun> = COALESCE(<ustun>, 0) + d.delta FROM (VALUES ...) AS d WHERE <kalit> = d.key
+    Kalitlar tartiblangan - parallel jarayonlar orasida deadlock bo'lmasligi uchun.
+    Yangilangan qatorlarning kalitlarini qaytaradi (mos qator topilmaganlarini aniqlash uchun).
+    """
+    deltas_table = values(
+        column('key', BigInteger), column('delta', Integer), name='deltas'
+    ).data(sorted(deltas.items()))
+    return db.execute(
+        update(model)
+        .where(key_column == deltas_table.c.key)
+        .values({counter_column: func.coalesce(counter_column, 0) + deltas_table.c.delta})
+        .returning(key_column)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
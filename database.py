@@ -1,8 +1,9 @@
 # database.py
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, Text, BigInteger, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, Text, BigInteger, ForeignKey, text, inspect
 from sqlalchemy.orm import declarative_base, sessionmaker
 from datetime import datetime
+from text_normalizer import build_search_key, split_genres
 
 # DATABASE_URL Railway muhit o'zgaruvchilaridan olinadi
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -41,6 +42,20 @@ class Movie(Base):
     views = Column(Integer, default=0)
     added_date = Column(DateTime, default=datetime.utcnow)
     tmdb_id = Column(Integer, nullable=True)
+    # Qidiruv kaliti: nom va asl nomning normallashtirilgan (lotin, apostrofsiz) shakli.
+    # Kino qo'shilganda hisoblanadi, shuning uchun SQL da har so'rovda regex kerak emas.
+    search_key = Column(Text, nullable=True)
+
+class Genre(Base):
+    __tablename__ = "genres"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False, unique=True)
+
+class MovieGenre(Base):
+    # Kino va janr bog'lanishi. Asosiy kalit (genre_id, movie_id) janr bo'yicha qidiruvni indeks orqali bajaradi.
+    __tablename__ = "movie_genres"
+    genre_id = Column(Integer, ForeignKey('genres.id', ondelete='CASCADE'), primary_key=True)
+    movie_id = Column(Integer, ForeignKey('movies.id', ondelete='CASCADE'), primary_key=True, index=True)
 
 class Channel(Base):
     __tablename__ = "channels"
@@ -51,6 +66,14 @@ class Channel(Base):
     is_active = Column(Boolean, default=True)
     added_date = Column(DateTime, default=datetime.utcnow)
 
+class ChannelMember(Base):
+    # Majburiy kanallardagi a'zolik holati: chat_member yangilanishlaridan yoki birinchi marta get_chat_member dan
+    __tablename__ = "channel_members"
+    channel_username = Column(String, primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)
+    is_member = Column(Boolean, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class Payment(Base):
     __tablename__ = "payments"
     id = Column(BigInteger, primary_key=True, index=True)
@@ -83,6 +106,24 @@ class Broadcast(Base):
     total_users = Column(Integer)
     success_count = Column(Integer, default=0)
     failed_count = Column(Integer, default=0)
+    # Qayta ishga tushganda davom ettirish uchun: yuboriladigan xabar va yuborish kursori
+    content_chat_id = Column(BigInteger, nullable=True)
+    content_message_id = Column(BigInteger, nullable=True)
+    content_reply_markup = Column(Text, nullable=True)
+    max_user_id = Column(BigInteger, nullable=True)     # Qabul qiluvchilar ro'yxatidagi eng katta ID
+    cursor_user_id = Column(BigInteger, nullable=True)  # Shu ID gacha (tartib bo'yicha) hammasi tugagan
+    delivered_ahead = Column(Text, nullable=True)       # Kursordan keyin tugaganlar (vergul bilan)
+    owner = Column(String(64), nullable=True)           # Yuborayotgan jarayon (lease egasi)
+    lease_expires = Column(DateTime, nullable=True)     # Shu vaqtgacha yangilanmasa boshqa jarayon egallashi mumkin
+
+class WatchEvent(Base):
+    # Har bir kino yuborilishi (faqat qo'shiladi). PostgreSQL da ts bo'yicha oylik bo'laklarga (partition) ajratilgan.
+    __tablename__ = "watch_events"
+    __table_args__ = {"postgresql_partition_by": "RANGE (ts)"}
+    ts = Column(DateTime, primary_key=True, default=datetime.utcnow)
+    user_id = Column(BigInteger, primary_key=True)
+    movie_id = Column(Integer, primary_key=True)
+    source = Column(String(16), nullable=False) # inline, code, deeplink, favorites
 
 # Sozlamalar uchun alohida jadval
 class Settings(Base):
@@ -90,9 +131,161 @@ class Settings(Base):
     key = Column(String, primary_key=True)
     value = Column(Text) # Narxlar, karta ma'lumotlari JSON matn sifatida saqlanadi
 
+# Qidiruv imkoniyatlari holati. init_db() ishga tushganda aniqlanadi.
+_search_features = {"trgm": False}
+
+def is_trgm_available():
+    """pg_trgm kengaytmasi va uning indekslari tayyor ekanligini bildiradi"""
+    return _search_features["trgm"]
+
+def _init_search_indexes():
+    """pg_trgm kengaytmasi va kino nomlari uchun GIN indekslarini yaratish (faqat PostgreSQL)"""
+    if engine.dialect.name != "postgresql":
+        return
+
+    # Kengaytmani yaratish uchun huquq bo'lmasligi mumkin, shuning uchun alohida tranzaksiyada.
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except Exception as e:
+        print(f"pg_trgm kengaytmasini yaratib bo'lmadi: {e}")
+
+    try:
+        with engine.begin() as conn:
+            installed = conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).scalar()
+            if not installed:
+                print("pg_trgm mavjud emas, qidiruv oddiy ILIKE rejimida ishlaydi.")
+                return
+            # Trigram GIN indeksi LIKE '%q%' va "%" (o'xshashlik) operatorlarini indeks orqali bajaradi.
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_movies_search_key_trgm ON movies USING gin (search_key gin_trgm_ops)"))
+            # Qidiruv endi search_key bo'yicha, eski nom indekslari kerak emas
+            conn.execute(text("DROP INDEX IF EXISTS ix_movies_title_trgm"))
+            conn.execute(text("DROP INDEX IF EXISTS ix_movies_original_title_trgm"))
+        _search_features["trgm"] = True
+    except Exception as e:
+        print(f"Trigram indekslarini yaratishda xatolik: {e}")
+
+def _init_catalog_columns():
+    """Mavjud movies jadvaliga keyin qo'shilgan ustunlarni qo'shish va to'ldirish"""
+    try:
+        columns = {column['name'] for column in inspect(engine).get_columns('movies')}
+        if 'search_key' not in columns:
+            with engine.begin() as conn:
+                conn.execute(text("ALTER TABLE movies ADD COLUMN search_key TEXT"))
+            print("movies.search_key ustuni qo'shildi.")
+        _backfill_search_keys()
+        _backfill_movie_genres()
+    except Exception as e:
+        print(f"Katalog ustunlarini yangilashda xatolik: {e}")
+
+def _backfill_search_keys(batch_size: int = 1000):
+    """search_key bo'sh bo'lgan kinolar uchun qidiruv kalitini hisoblash (qismlab)"""
+    total = 0
+    with SessionLocal() as db:
+        while True:
+            rows = db.query(Movie.id, Movie.title, Movie.original_title).filter(
+                Movie.search_key == None
+            ).order_by(Movie.id).limit(batch_size).all()
+            if not rows:
+                break
+            db.bulk_update_mappings(Movie, [
+                {"id": movie_id, "search_key": build_search_key(title, original_title)}
+                for movie_id, title, original_title in rows
+            ])
+            db.commit()
+            total += len(rows)
+    if total:
+        print(f"{total} ta kino uchun search_key to'ldirildi.")
+
+def _backfill_movie_genres(batch_size: int = 500):
+    """Movie.genres matnidan genres/movie_genres jadvallarini to'ldirish (hali bog'lanmagan kinolar uchun)"""
+    total = 0
+    last_id = 0
+    with SessionLocal() as db:
+        genre_ids = {name: genre_id for genre_id, name in db.query(Genre.id, Genre.name).all()}
+        while True:
+            rows = db.query(Movie.id, Movie.genres).filter(
+                Movie.id > last_id,
+                Movie.genres != None,
+                Movie.genres != '',
+                ~db.query(MovieGenre).filter(MovieGenre.movie_id == Movie.id).exists()
+            ).order_by(Movie.id).limit(batch_size).all()
+            if not rows:
+                break
+            links = []
+            for movie_id, genres_text in rows:
+                for name in split_genres(genres_text):
+                    if name not in genre_ids:
+                        genre = Genre(name=name)
+                        db.add(genre)
+                        db.flush()
+                        genre_ids[name] = genre.id
+                    links.append({"movie_id": movie_id, "genre_id": genre_ids[name]})
+            if links:
+                db.bulk_insert_mappings(MovieGenre, links)
+            db.commit()
+            total += len(rows)
+            last_id = rows[-1][0]
+    if total:
+        print(f"{total} ta kino janrlari movie_genres jadvaliga ko'chirildi.")
+
+def _init_broadcast_columns():
+    """Mavjud broadcasts jadvaliga davom ettirish (kursor) ustunlarini qo'shish"""
+    new_columns = {
+        "content_chat_id": "BIGINT", "content_message_id": "BIGINT", "content_reply_markup": "TEXT",
+        "max_user_id": "BIGINT", "cursor_user_id": "BIGINT", "delivered_ahead": "TEXT",
+        "owner": "VARCHAR(64)", "lease_expires": "TIMESTAMP",
+    }
+    try:
+        columns = {column['name'] for column in inspect(engine).get_columns('broadcasts')}
+        missing = [name for name in new_columns if name not in columns]
+        if missing:
+            with engine.begin() as conn:
+                for name in missing:
+                    conn.execute(text(f"ALTER TABLE broadcasts ADD COLUMN {name} {new_columns[name]}"))
+            print(f"broadcasts jadvaliga ustunlar qo'shildi: {', '.join(missing)}")
+    except Exception as e:
+        print(f"Broadcast ustunlarini yangilashda xatolik: {e}")
+
+def _init_catalog_indexes():
+    """Keyset sahifalash uchun (tartiblash kaliti, id) indekslari. Mavjud jadvallar uchun ham yaratiladi."""
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_movies_added_date_id ON movies (added_date DESC, id DESC)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_movies_views_id ON movies (views DESC, id DESC)"))
+    except Exception as e:
+        print(f"Katalog indekslarini yaratishda xatolik: {e}")
+
+def _month_start(value: datetime, offset: int = 0):
+    month_index = value.year * 12 + value.month - 1 + offset
+    return datetime(month_index // 12, month_index % 12 + 1, 1)
+
+def ensure_watch_event_partitions(months_ahead: int = 2):
+    """watch_events uchun joriy va keyingi months_ahead oy bo'laklarini yaratish (faqat PostgreSQL)"""
+    if engine.dialect.name != "postgresql":
+        return
+    try:
+        with engine.begin() as conn:
+            # Oraliqqa tushmagan yozuvlar yo'qolmasligi uchun zaxira bo'lak
+            conn.execute(text("CREATE TABLE IF NOT EXISTS watch_events_default PARTITION OF watch_events DEFAULT"))
+            now = datetime.utcnow()
+            for offset in range(months_ahead + 1):
+                start, end = _month_start(now, offset), _month_start(now, offset + 1)
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS watch_events_{start:%Y_%m} PARTITION OF watch_events "
+                    f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+                ))
+    except Exception as e:
+        print(f"watch_events bo'laklarini yaratishda xatolik: {e}")
+
 def init_db():
     """Ma'lumotlar bazasi jadvallarini yaratish"""
     Base.metadata.create_all(bind=engine)
+    _init_catalog_columns()
+    _init_broadcast_columns()
+    _init_catalog_indexes()
+    _init_search_indexes()
+    ensure_watch_event_partitions()
     print("Ma'lumotlar bazasi jadvallari yaratildi yoki mavjud.")
 class Favorite(Base):
     __tablename__ = "favorites"
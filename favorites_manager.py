@@ -1,12 +1,19 @@
 # favorites_manager.py (YANGI va TO'G'RI KOD)
 import logging
 from database import Favorite, SessionLocal
+from ttl_cache import TTLCache
+from config import FAVORITES_CACHE_SIZE, FAVORITES_CACHE_TTL
 
 logger = logging.getLogger(__name__)
 
 class FavoritesManager:
+    def __init__(self):
+        # {user_id: frozenset(movie_id)} - inline natijalarda har bir kino uchun alohida so'rov yubormaslik uchun
+        self.favorites_cache = TTLCache(maxsize=FAVORITES_CACHE_SIZE, ttl=FAVORITES_CACHE_TTL)
+
     def toggle_favorite(self, user_id: int, movie_id: int):
         """Kinoni sevimlilarga qo'shadi yoki olib tashlaydi."""
+        self.favorites_cache.invalidate(user_id)
         with SessionLocal() as db:
             try:
                 existing_fav = db.query(Favorite).filter_by(user_id=user_id, movie_id=movie_id).first()
@@ -42,6 +49,20 @@ class FavoritesManager:
 
 # favorites_manager.py faylida FAQAT SHU FUNKSIYANI ALMASHTIRING
 
+    def get_favorite_ids(self, user_id: int):
+        """Foydalanuvchi sevimlilaridagi kino ID lari to'plami (keshdan)"""
+        favorite_ids = self.favorites_cache.get(user_id)
+        if favorite_ids is None:
+            with SessionLocal() as db:
+                try:
+                    rows = db.query(Favorite.movie_id).filter(Favorite.user_id == user_id).all()
+                except Exception as e:
+                    logger.error(f"Sevimlilar ro'yxatini olishda xatolik: {e}")
+                    return frozenset()
+            favorite_ids = frozenset(movie_id for (movie_id,) in rows)
+            self.favorites_cache.set(user_id, favorite_ids)
+        return favorite_ids
+
     def get_user_favorites(self, user_id: int):
         """Foydalanuvchining barcha sevimlilari ro'yxatini (kino IDlari) olish"""
         with SessionLocal() as db:
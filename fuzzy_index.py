@@ -0,0 +1,187 @@
+# fuzzy_index.py
+import heapq
+import logging
+from threading import RLock
+
+from text_normalizer import tokenize
+
+logger = logging.getLogger(__name__)
+
+MIN_TOKEN_LENGTH = 3        # Bundan qisqa so'zlar uchun xatoni tuzatish ma'nosiz
+MAX_CANDIDATES = 150        # Bitta so'z uchun tekshiriladigan nomzodlar chegarasi (1 masofadagilar doim to'liq tekshiriladi)
+MAX_MATCHES_PER_TOKEN = 2000  # Bitta so'z uchun yig'iladigan kinolar chegarasi
+
+def edit_distance(source: str, target: str, max_distance: int):
+    """
+    Damerau-Levenshtein (OSA) masofasi. Masofa max_distance dan oshsa,
+    hisoblash erta to'xtatiladi va max_distance + 1 qaytariladi.
+    """
+    if abs(len(source) - len(target)) > max_distance:
+        return max_distance + 1
+    if source == target:
+        return 0
+
+    previous_previous = None
+    previous = list(range(len(target) + 1))
+    for i in range(1, len(source) + 1):
+        current = [i] + [0] * len(target)
+        row_min = current[0]
+        for j in range(1, len(target) + 1):
+            cost = 0 if source[i - 1] == target[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous_previous is not None and i > 1 and j > 1
+                    and source[i - 1] == target[j - 2] and source[i - 2] == target[j - 1]):
+                value = min(value, previous_previous[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return previous[-1] if previous[-1] <= max_distance else max_distance + 1
+
+
+class FuzzyTitleIndex:
+    """
+    Kino nomlaridagi so'zlar bo'yicha SymSpell (o'chirishlar lug'ati) indeksi.
+    Imlo xatosi bilan yozilgan so'rovlarga oldindan hisoblangan o'chirishlar orqali
+    cheklangan vaqtda javob beradi va katalog o'zgarganda qisman yangilanadi.
+    """
+
+    def __init__(self, max_distance: int = 2, prefix_length: int = 7):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.lock = RLock()
+        self._ready = False
+        self._deletes = {}     # {o'chirilgan_variant: set(so'zlar)}
+        self._words = {}       # {so'z: set(movie_id)}
+        self._doc_words = {}   # {movie_id: set(so'zlar)}
+        self._views = {}       # {movie_id: views} - teng natijalarni tartiblash uchun
+
+    def is_ready(self):
+        return self._ready
+
+    def build(self, movies):
+        with self.lock:
+            self._deletes.clear()
+            self._words.clear()
+            self._doc_words.clear()
+            self._views.clear()
+            for movie in movies:
+                self._index_movie(movie)
+            self._ready = True
+        logger.info(f"Imlo xatolari indeksi qurildi: {len(self._words)} so'z, {len(self._deletes)} variant")
+
+    def add(self, movie):
+        with self.lock:
+            self._unindex_movie(movie.id)
+            self._index_movie(movie)
+
+    def remove(self, movie_id: int):
+        with self.lock:
+            self._unindex_movie(movie_id)
+
+    def increment_views(self, movie_id: int, delta: int = 1):
+        with self.lock:
+            if movie_id in self._views:
+                self._views[movie_id] += delta
+
+    def lookup(self, query: str, limit: int = 50):
+        """
+        So'rov so'zlariga eng yaqin so'zlari bor kinolar ID lari.
+        Tartib: ko'proq so'z mos kelgan, umumiy masofa kichik, ko'proq ko'rilgan.
+        """
+        tokens = [token for token in tokenize(query) if len(token) >= MIN_TOKEN_LENGTH]
+        if not tokens:
+            return []
+
+        with self.lock:
+            matches = {}  # {movie_id: {token: distance}}
+            for token in tokens:
+                collected = 0
+                # Yaqinroq so'zlar birinchi; juda ko'p kino yig'ilsa qolganlari tashlab ketiladi
+                for word, distance in sorted(self._suggest(token), key=lambda item: (item[1], item[0])):
+                    if collected >= MAX_MATCHES_PER_TOKEN:
+                        break
+                    for movie_id in self._words[word]:
+                        token_distances = matches.setdefault(movie_id, {})
+                        if distance < token_distances.get(token, self.max_distance + 1):
+                            token_distances[token] = distance
+                    collected += len(self._words[word])
+
+            ranked = heapq.nsmallest(
+                limit, matches.items(),
+                key=lambda item: (-len(item[1]), sum(item[1].values()), -self._views.get(item[0], 0), -item[0])
+            )
+            return [movie_id for movie_id, _ in ranked]
+
+    # --- Ichki yordamchi funksiyalar ---
+
+    def _max_distance_for(self, word: str):
+        # Qisqa so'zlarda 2 ta xato butunlay boshqa so'zga aylantirib yuboradi
+        return min(self.max_distance, 1 if len(word) <= 4 else self.max_distance)
+
+    def _delete_levels(self, word: str, max_distance: int):
+        """So'z prefiksidan 0, 1, ..., max_distance ta harf o'chirib olingan variantlar (har bir daraja alohida)"""
+        frontier = {word[:self.prefix_length]}
+        levels = [frontier]
+        seen = set(frontier)
+        for _ in range(max_distance):
+            frontier = {variant[:i] + variant[i + 1:] for variant in frontier if len(variant) > 1 for i in range(len(variant))} - seen
+            seen |= frontier
+            levels.append(frontier)
+        return levels
+
+    def _delete_variants(self, word: str, max_distance: int):
+        """So'z prefiksidan max_distance tagacha harf o'chirib olingan barcha variantlar"""
+        return set().union(*self._delete_levels(word, max_distance))
+
+    def _suggest(self, token: str):
+        """
+        token ga ruxsat etilgan masofada bo'lgan lug'at so'zlari: [(so'z, masofa)].
+        Nomzodlar o'chirishlar darajasi bo'yicha (yaqinlari birinchi, bir daraja ichida alifbo tartibida) tekshiriladi.
+        1 masofadagi barcha so'zlar 0 va 1-darajalarda topiladi, shuning uchun MAX_CANDIDATES faqat undan keyin qo'llanadi.
+        """
+        max_distance = self._max_distance_for(token)
+        checked = set()
+        suggestions = []
+        for level, variants in enumerate(self._delete_levels(token, max_distance)):
+            if level > 1 and len(checked) >= MAX_CANDIDATES:
+                break
+            for variant in sorted(variants):
+                for word in sorted(self._deletes.get(variant, set()) - checked):
+                    if level > 1 and len(checked) >= MAX_CANDIDATES:
+                        break
+                    checked.add(word)
+                    distance = edit_distance(token, word, max_distance)
+                    if distance <= max_distance:
+                        suggestions.append((word, distance))
+        return suggestions
+
+    def _index_movie(self, movie):
+        words = {word for word in tokenize(movie.title) + tokenize(movie.original_title) if len(word) >= MIN_TOKEN_LENGTH}
+        for word in words:
+            movie_ids = self._words.get(word)
+            if movie_ids is None:
+                movie_ids = self._words[word] = set()
+                for variant in self._delete_variants(word, self.max_distance):
+                    self._deletes.setdefault(variant, set()).add(word)
+            movie_ids.add(movie.id)
+        self._doc_words[movie.id] = words
+        self._views[movie.id] = movie.views or 0
+
+    def _unindex_movie(self, movie_id: int):
+        for word in self._doc_words.pop(movie_id, ()):
+            movie_ids = self._words.get(word)
+            if movie_ids is None:
+                continue
+            movie_ids.discard(movie_id)
+            if movie_ids:
+                continue
+            del self._words[word]
+            for variant in self._delete_variants(word, self.max_distance):
+                words = self._deletes.get(variant)
+                if words is not None:
+                    words.discard(word)
+                    if not words:
+                        del self._deletes[variant]
+        self._views.pop(movie_id, None)
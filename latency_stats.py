@@ -0,0 +1,28 @@
+# latency_stats.py
+import time
+from collections import deque
+from threading import Lock
+
+
+class LatencyStats:
+    """So'nggi maxlen ta o'lchov bo'yicha kechikish statistikasi (p50/p95/p99, millisekund)"""
+
+    def __init__(self, maxlen: int = 1000):
+        self.lock = Lock()
+        self._samples = deque(maxlen=maxlen)
+        self.count = 0
+
+    def record(self, started: float):
+        """started - time.perf_counter() bilan olingan boshlanish vaqti"""
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self.lock:
+            self._samples.append(elapsed_ms)
+            self.count += 1
+
+    def stats(self):
+        with self.lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {"count": self.count, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+        pick = lambda fraction: round(samples[min(len(samples) - 1, int(fraction * len(samples)))], 1)
+        return {"count": self.count, "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
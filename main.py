@@ -3,6 +3,8 @@ from telebot import types
 import logging
 import time
 import os
+import signal
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 from database import Payment, SessionLocal # Fayl boshida import qilinganiga ishonch hosil qiling
 from broadcast_manager import BroadcastManager
@@ -13,12 +15,16 @@ from favorites_manager import FavoritesManager # <<< YANGI QATOR
 from config import (
     BOT_TOKEN, PRIVATE_CHANNEL_ID, ADMIN_CHAT_ID, BOT_USERNAME,
     START_MESSAGE, MOVIE_NOT_FOUND_FOR_USER, MEMBERSHIP_REQUIRED_MESSAGE,
-    KEYBOARD_TEXTS, ADMIN_COMMANDS, PAYMENT_INSTRUCTION_MESSAGE, PREMIUM_SUCCESS_MESSAGE
+    KEYBOARD_TEXTS, ADMIN_COMMANDS, PAYMENT_INSTRUCTION_MESSAGE, PREMIUM_SUCCESS_MESSAGE,
+    INLINE_CACHE_TIME, INLINE_VIDEO_RESULTS, MEMBERSHIP_CHECK_WORKERS, MEMBERSHIP_CHECK_TIMEOUT
 )
 from database import init_db, Payment # Ma'lumotlar bazasini ishga tushirish # Ma'lumotlar bazasini ishga tushirish
 from movie_manager import MovieManager
 from user_manager import UserManager
-from channel_manager import ChannelManager
+from channel_manager import ChannelManager, is_active_member
+from request_context import RequestContextMiddleware
+from watch_log import WatchEventLog
+from latency_stats import LatencyStats
 from payment_manager import PaymentManager
 from broadcast_manager import BroadcastManager
 from tmdb_handler import TMDBHandler
@@ -54,7 +60,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Bot va global o'zgaruvchilar
-bot = telebot.TeleBot(BOT_TOKEN, threaded=True)
+bot = telebot.TeleBot(BOT_TOKEN, threaded=True, use_class_middlewares=True)
 try:
     ADMIN_IDS = [int(admin_id.strip()) for admin_id in ADMIN_CHAT_ID.split(',')]
     print(f"✅ Admin ID lar yuklandi: {ADMIN_IDS}")
@@ -76,45 +82,125 @@ payment_manager = PaymentManager()
 broadcast_manager = BroadcastManager()
 tmdb_handler = TMDBHandler()
 favorites_manager = FavoritesManager() # <<< YANGI QATOR
+watch_log = WatchEventLog() # Har bir kino yuborilishi watch_events jadvaliga (fon oqimi orqali)
+delivery_latency = LatencyStats() # send_movie boshidan send_video chaqirilguncha
 
+# Har bir yangilanish uchun foydalanuvchi holati bir marta aniqlanib, handlerlarga ctx sifatida beriladi
+bot.setup_middleware(RequestContextMiddleware(user_manager, channel_manager, payment_manager))
+
+INLINE_VIDEO_PREFIX = "v" # Inline video natija ID si: "v<movie_id>" (maqolalar esa faqat "<movie_id>")
 DEFAULT_POSTER_URL = "https://static6.tgstat.ru/channels/_0/e7/e784ac572ebd86f1e52232e1697a8c81.jpg"
-def is_user_member(user_id):
-    """Foydalanuvchi kanalga a'zo yoki premium ekanligini tekshirish"""
+
+# get_chat_member so'rovlari uchun umumiy, hajmi cheklangan oqimlar havzasi
+membership_executor = ThreadPoolExecutor(max_workers=MEMBERSHIP_CHECK_WORKERS, thread_name_prefix="membership")
+
+def fetch_channel_membership(user_id, channel_username):
+    """Telegram API orqali a'zolikni tekshirish va natijani saqlash (keyingi safar mahalliy tekshiriladi)"""
+    member = bot.get_chat_member(f"@{channel_username}", user_id)
+    is_member = is_active_member(member)
+    channel_manager.save_membership(user_id, channel_username, is_member)
+    return is_member
+
+def is_user_member(ctx):
+    """Foydalanuvchi kanalga a'zo yoki premium ekanligini tekshirish (RequestContext bo'yicha)"""
     try:
-        if payment_manager.is_premium_user(user_id):
+        user_id = ctx.user_id
+        if ctx.is_premium:
             return True
-        if not channel_manager.is_membership_required():
+        if not ctx.membership_required:
             return True
 
-        channels = channel_manager.get_channel_list_for_check()
+        channels = ctx.channels
         if not channels:
             return True
 
+        unchecked = []
         for channel in channels:
-            try:
-                member = bot.get_chat_member(f"@{channel.username}", user_id)
-                if member.status not in ['member', 'administrator', 'creator']:
-                    return False
-            except Exception:
-                logger.warning(f"Kanal a'zoligini tekshirib bo'lmadi: @{channel.username}")
-                continue
+            cached = channel_manager.get_cached_membership(user_id, channel.username)
+            if cached is None:
+                unchecked.append(channel.username)
+            elif not cached:
+                return False
+        if not unchecked:
+            return True
+
+        # chat_member yangilanishlari bilan yuritiladigan jadvaldan
+        stored = channel_manager.get_stored_memberships(user_id, unchecked)
+        for username, is_member in stored.items():
+            channel_manager.cache_membership(user_id, username, is_member)
+            if not is_member:
+                return False
+        unchecked = [username for username in unchecked if username not in stored]
+        if not unchecked:
+            return True
+
+        # Jadvalda ham yo'q kanallar (birinchi marta ko'rilgan foydalanuvchi) parallel tekshiriladi: birinchi "a'zo emas" javobida to'xtaymiz,
+        # belgilangan vaqtda javob bermagan kanal (xatolikdagi kabi) o'tkazib yuboriladi.
+        futures = {
+            membership_executor.submit(fetch_channel_membership, user_id, username): username
+            for username in unchecked
+        }
+        deadline = time.monotonic() + MEMBERSHIP_CHECK_TIMEOUT
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                for future in pending:
+                    future.cancel()
+                    logger.warning(f"Kanal a'zoligini tekshirish vaqti tugadi: @{futures[future]}")
+                break
+            for future in done:
+                try:
+                    if not future.result():
+                        for other in pending:
+                            other.cancel()
+                        return False
+                except Exception:
+                    logger.warning(f"Kanal a'zoligini tekshirib bo'lmadi: @{futures[future]}")
         return True
     except Exception as e:
         logger.error(f"A'zolik tekshirishda umumiy xatolik: {e}")
         return False
 
-def get_subscription_keyboard():
+def get_subscription_keyboard(channels, prices):
     """Majburiy obuna klaviaturasi"""
     keyboard = types.InlineKeyboardMarkup(row_width=1)
-    channels = channel_manager.get_channel_list_for_check()
     for channel in channels:
         keyboard.add(types.InlineKeyboardButton(f"📢 {channel.name}", url=channel.url))
     keyboard.add(types.InlineKeyboardButton(KEYBOARD_TEXTS['check_subscription'], callback_data='check_subscription'))
-    prices = payment_manager.get_prices()
     keyboard.add(types.InlineKeyboardButton(f"💎 Premium ({prices['week']:,} so'm/hafta)", callback_data='show_premium'))
     return keyboard
 
-def get_main_keyboard(user_id):
+# Oxirgi tayyorlangan majburiy a'zolik xabari: (kalit, matn, klaviatura JSON)
+membership_gate = (None, None, None)
+
+def render_membership_gate(channels):
+    """
+    Majburiy a'zolik xabari va klaviaturasi oldindan tayyorlab qo'yiladi.
+    Faqat kanallar yoki narxlar o'zgarganda qayta quriladi (ikkalasi ham keshdan o'qiladi).
+    """
+    global membership_gate
+    prices = payment_manager.get_prices()
+    key = (tuple((ch.name, ch.url) for ch in channels), prices['week'], prices['month'], prices['year'])
+    cached_key, text, markup = membership_gate
+    if cached_key == key:
+        return text, markup
+    text = MEMBERSHIP_REQUIRED_MESSAGE.format(
+        channels="\n".join([f"📢 {ch.name}" for ch in channels]),
+        week_price=prices['week'],
+        month_price=prices['month'],
+        year_price=prices['year']
+    )
+    markup = get_subscription_keyboard(channels, prices).to_json()
+    membership_gate = (key, text, markup)
+    return text, markup
+
+def send_membership_required(ctx):
+    """A'zo bo'lmagan foydalanuvchiga tayyor xabarni yuborish"""
+    text, markup = render_membership_gate(ctx.channels)
+    bot.send_message(ctx.user_id, text, reply_markup=markup, parse_mode='HTML')
+
+def get_main_keyboard(ctx):
     """Asosiy menyu klaviaturasi"""
     keyboard = types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
     keyboard.add(
@@ -127,11 +213,11 @@ def get_main_keyboard(user_id):
     )
     # <<< YANGI QATORLAR SHU YERDA >>>
     favorites_btn = types.KeyboardButton("❤️ Tanlanganlarim")
-    premium_btn = types.KeyboardButton(KEYBOARD_TEXTS['premium'] + (" ✅" if payment_manager.is_premium_user(user_id) else ""))
+    premium_btn = types.KeyboardButton(KEYBOARD_TEXTS['premium'] + (" ✅" if ctx.is_premium else ""))
     keyboard.add(favorites_btn, premium_btn) # Premium bilan bir qatorda
     # <<< O'ZGARISH TUGADI >>>
 
-    if user_id in ADMIN_IDS:
+    if ctx.user_id in ADMIN_IDS:
         keyboard.add(types.KeyboardButton(KEYBOARD_TEXTS['admin']))
     return keyboard
 def get_admin_keyboard():
@@ -160,85 +246,35 @@ def safe_edit_message(chat_id, message_id, text, **kwargs):
         logger.error(f"Xabarni tahrirlashda xatolik: {e}")
     return None
 
-def generate_movie_caption(movie):
-    """Film uchun caption yaratish (Movie obyektidan)"""
-    caption = f"🎬 <b>{movie.title}</b>"
-    if movie.original_title and movie.original_title.lower() != movie.title.lower():
-        caption += f" ({movie.original_title})"
-    caption += f"\n➖➖➖➖➖➖➖➖➖➖\n"
-    if movie.countries:
-        caption += f"🌍 Davlat: {movie.countries}\n"
-    if movie.genres:
-        caption += f"🎭 Janr: {' '.join(['#' + g.strip().replace(' ', '') for g in movie.genres.split(',')])}\n"
-    if movie.year:
-        caption += f"📆 Yil: {movie.year}\n"
-    if movie.rating and movie.rating > 0:
-        caption += f"⭐ Reyting: {movie.rating}\n"
-    caption += f"\n🔢 Kod: {movie.id}\n👁 Ko'rishlar: {movie.views}\n\n✅ @{BOT_USERNAME.replace('@','')} | Filmlar olami 🍿"
-    return caption
-
 # Eski send_movie funksiyasini O'CHIRIB, buni qo'ying
 
-def send_movie(chat_id, movie_id):
-    """Film yuborish logikasi (Tanlanganlar tugmasi bilan)"""
+def send_movie(ctx, movie_id, source='code'):
+    """Film yuborish logikasi (Tanlanganlar tugmasi bilan). source - ko'rishlar jurnali uchun manba"""
+    chat_id = ctx.user_id
+    started = time.perf_counter()
     try:
-        # Foydalanuvchi mavjudligini tekshirish va aktivligini yangilash
-        # Biz user_manager.add_user() ni ishlatmaymiz, chunki u keraksiz yangilanishlar qilishi mumkin.
-        # Buning o'rniga, user_managerga yangi, sodda funksiya qo'shishimiz mumkin, lekin hozircha bu shart emas.
-        # Agar foydalanuvchi biror harakat qilsa, u allaqachon bazada bo'ladi.
+        # Yagona so'rov - kino va sevimlilar belgisi; a'zolik keshdan, hisoblagichlar esa fon oqimlari orqali yoziladi.
 
         # -1 ID maxsus holat, majburiy a'zolik xabarini chiqarish uchun
-        if movie_id == -1:
-             prices = payment_manager.get_prices()
-             text = MEMBERSHIP_REQUIRED_MESSAGE.format(
-                channels="\n".join([f"📢 {ch.name}" for ch in channel_manager.get_channel_list_for_check()]),
-                week_price=prices['week'],
-                month_price=prices['month'],
-                year_price=prices['year']
-             )
-             bot.send_message(chat_id, text, reply_markup=get_subscription_keyboard(), parse_mode='HTML')
-             return
-
-        if not is_user_member(chat_id):
-            prices = payment_manager.get_prices()
-            text = MEMBERSHIP_REQUIRED_MESSAGE.format(
-                channels="\n".join([f"📢 {ch.name}" for ch in channel_manager.get_channel_list_for_check()]),
-                week_price=prices['week'],
-                month_price=prices['month'],
-                year_price=prices['year']
-            )
-            bot.send_message(chat_id, text, reply_markup=get_subscription_keyboard(), parse_mode='HTML')
+        if movie_id == -1 or not is_user_member(ctx):
+            send_membership_required(ctx)
             return
 
-        movie = movie_manager.get_movie(movie_id)
+        movie, is_favorite = movie_manager.get_movie_for_delivery(movie_id, chat_id)
         if not movie:
             bot.send_message(chat_id, MOVIE_NOT_FOUND_FOR_USER.format(username=BOT_USERNAME.replace('@', '')), parse_mode='HTML')
             return
 
-        # Ko'rishlar sonini yangilash
-        new_views = movie_manager.update_views(movie_id)
-        movie.views = new_views # Obyektni ham yangilab qo'yamiz
+        # Ko'rishlar sonini yangilash (xotirada yig'iladi, fon oqimi bazaga yozadi)
+        movie_manager.update_views(movie_id)
+        views = movie_manager.get_display_views(movie)
         user_manager.increment_movie_watch(chat_id)
+        watch_log.record(chat_id, movie_id, source)
 
-        # Caption va tugmalarni tayyorlash
-        caption = generate_movie_caption(movie)
-
-        # <<< TUGMALAR BLOKI SHU YERDA YANGILANDI >>>
-        is_favorite = favorites_manager.is_in_favorites(chat_id, movie_id)
-        favorite_text = "💔 Sevimlilardan olib tashlash" if is_favorite else "❤️ Sevimlilarga qo'shish"
-
-        keyboard = types.InlineKeyboardMarkup(row_width=2) # row_width=2 qildik
-
-        # Birinchi qator: Sevimlilar tugmasi
-        keyboard.add(types.InlineKeyboardButton(favorite_text, callback_data=f"fav_{movie_id}"))
-
-        # Ikkinchi qator: Ulashish va Qidirish tugmalari
-        keyboard.add(
-            types.InlineKeyboardButton("↪️ Ulashish", switch_inline_query=movie.title),
-            types.InlineKeyboardButton("🔎 Boshqa kinolar", switch_inline_query_current_chat="")
-        )
-        # <<< O'ZGARISH TUGADI >>>
+        # Caption va tugmalar keshdan: faqat ko'rishlar soni va sevimlilar tugmasi o'zgaradi
+        caption, keyboard = movie_manager.render_cache.render(movie, views, is_favorite)
 
+        delivery_latency.record(started)
         bot.send_video(chat_id, movie.file_id, caption=caption, parse_mode='HTML', reply_markup=keyboard, protect_content=True)
         logger.info(f"Film yuborildi: ID {movie_id}, Chat ID {chat_id}")
 
@@ -268,43 +304,116 @@ def handle_broadcast_content(message):
     """Ommaviy xabar uchun kontentni qabul qilish va yuborishni boshlash"""
     admin_id = message.from_user.id
     try:
-        # Premium bo'lmagan foydalanuvchilarni olish
-        all_users = user_manager.get_all_user_ids()
-        non_premium_users = [uid for uid in all_users if not payment_manager.is_premium_user(uid)]
+        non_premium_users = get_broadcast_recipients()
 
         if not non_premium_users:
             bot.send_message(admin_id, "❌ Xabar yuborish uchun (premium bo'lmagan) foydalanuvchilar topilmadi.")
             user_states.pop(admin_id, None)
             return
 
+        # Holat xabari: broadcast davomida yuborish tezligi bilan yangilanib turadi
+        status_message = bot.send_message(admin_id, f"⏳ Ommaviy xabar yuborish boshlanmoqda...\nJami: {len(non_premium_users)} ta foydalanuvchi.")
+
+        on_progress = make_broadcast_progress_reporter(admin_id, status_message.message_id)
+
         # Broadcastni boshlash
-        broadcast_id = broadcast_manager.start_broadcast(bot, non_premium_users, message, admin_id)
+        broadcast_id = broadcast_manager.start_broadcast(bot, non_premium_users, message, admin_id, on_progress=on_progress)
         if broadcast_id:
-             bot.send_message(admin_id, f"✅ Ommaviy xabar yuborish boshlandi!\nJami: {len(non_premium_users)} ta foydalanuvchi.\nID: `{broadcast_id}`", parse_mode="Markdown")
+             progress = broadcast_manager.get_broadcast_progress(broadcast_id)
+             if progress:
+                 on_progress(progress)
         else:
-             bot.send_message(admin_id, "❌ Ommaviy xabarni boshlashda xatolik yuz berdi.")
+             safe_edit_message(admin_id, status_message.message_id, "❌ Ommaviy xabarni boshlashda xatolik yuz berdi.")
     except Exception as e:
         logger.error(f"Ommaviy xabar yuborishda umumiy xatolik: {e}")
         bot.send_message(admin_id, "❌ Kutilmagan xatolik yuz berdi.")
     finally:
         user_states.pop(admin_id, None)
 
+def get_broadcast_recipients(after_user_id=None, max_user_id=None, joined_before=None):
+    """
+    Premium bo'lmagan foydalanuvchilar. Davom ettirilgan broadcast uchun ID oralig'i va broadcast boshlangan
+    vaqtgacha qo'shilganlar bilan cheklanadi (premium holati esa hozirgisi).
+    """
+    all_users = user_manager.get_all_user_ids(after_user_id, max_user_id, joined_before)
+    premium_users = payment_manager.get_active_premium_user_ids()
+    return [uid for uid in all_users if uid not in premium_users]
+
+def make_broadcast_progress_reporter(admin_id, status_message_id):
+    """Holat xabarini broadcast jarayoni bilan yangilab turuvchi on_progress funksiyasi"""
+    def on_progress(progress):
+        safe_edit_message(admin_id, status_message_id, format_broadcast_progress(progress),
+                          parse_mode='HTML', reply_markup=get_broadcast_cancel_keyboard(progress))
+    return on_progress
+
+def resume_broadcast_progress_reporter(broadcast):
+    """Qayta ishga tushgandan keyin davom ettirilgan broadcast uchun adminga yangi holat xabari"""
+    try:
+        status_message = bot.send_message(broadcast.admin_id, f"🔄 Tugallanmagan ommaviy xabar davom ettirilmoqda (ID: <code>{broadcast.id}</code>)...", parse_mode='HTML')
+    except Exception as e:
+        logger.warning(f"Adminga ({broadcast.admin_id}) broadcast holatini yuborib bo'lmadi: {e}")
+        return None
+    return make_broadcast_progress_reporter(broadcast.admin_id, status_message.message_id)
+
+def format_broadcast_progress(progress):
+    """Broadcast holati: yuborilgan/xato, tezlik va qolgan vaqt"""
+    done = progress['success'] + progress['failed']
+    if progress['cancelled']:
+        title = "⛔ <b>Ommaviy xabar bekor qilindi</b>"
+    elif done >= progress['total']:
+        title = "✅ <b>Ommaviy xabar yakunlandi</b>"
+    else:
+        title = "📢 <b>Ommaviy xabar yuborilmoqda...</b>"
+    eta = f"{int(progress['eta_s'] // 60)} daq {int(progress['eta_s'] % 60)} s" if progress['eta_s'] else "-"
+    return f"""{title}
+
+🆔 ID: <code>{progress['broadcast_id']}</code>
+📨 Jarayon: {done}/{progress['total']} ({done / progress['total']:.0%})
+✅ Yuborildi: {progress['success']}
+❌ Xatolik: {progress['failed']}
+⚡ Tezlik: {progress['rate']:.1f} xabar/s (chegara {progress['limit']:.0f}/s)
+⏱ Qolgan vaqt: {eta}"""
+
+def get_broadcast_cancel_keyboard(progress):
+    done = progress['success'] + progress['failed']
+    if progress['cancelled'] or done >= progress['total']:
+        return None
+    return types.InlineKeyboardMarkup([[
+        types.InlineKeyboardButton("⛔ To'xtatish", callback_data=f"cancel_broadcast_{progress['broadcast_id']}")
+    ]])
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('cancel_broadcast_') and call.from_user.id in ADMIN_IDS)
+def handle_cancel_broadcast(call):
+    try:
+        broadcast_id = int(call.data.split('_')[-1])
+        if broadcast_manager.cancel_broadcast(broadcast_id):
+            bot.answer_callback_query(call.id, "⛔ Ommaviy xabar to'xtatilmoqda...")
+        else:
+            bot.answer_callback_query(call.id, "Bu ommaviy xabar allaqachon tugagan.")
+    except Exception as e:
+        logger.error(f"Broadcastni bekor qilishda xatolik: {e}")
+        bot.answer_callback_query(call.id, "❌ Xatolik yuz berdi!")
+
 @bot.message_handler(commands=['start'])
-def start_command(message):
+def start_command(message, ctx):
     try:
         user_id = message.from_user.id
         user_manager.add_user(user_id, message.from_user.username, message.from_user.first_name, message.from_user.last_name)
 
-        if user_manager.is_banned(user_id):
+        if ctx.is_banned:
             bot.send_message(user_id, "❌ Siz botdan foydalanish uchun bloklangansiz.")
             return
 
         parts = message.text.split()
         if len(parts) > 1 and parts[1].isdigit():
-            send_movie(user_id, int(parts[1]))
+            # Inline natija tanlanganda xabar via_bot bilan keladi, aks holda bu havola (deep link)
+            send_movie(ctx, int(parts[1]), source='inline' if message.via_bot else 'deeplink')
+            return
+        if len(parts) > 1 and parts[1].startswith('fav') and parts[1][3:].isdigit():
+            send_movie(ctx, int(parts[1][3:]), source='favorites')
             return
 
-        bot.send_message(user_id, START_MESSAGE, reply_markup=get_main_keyboard(user_id), parse_mode='HTML')
+        bot.send_message(user_id, START_MESSAGE, reply_markup=get_main_keyboard(ctx), parse_mode='HTML')
     except Exception as e:
         logger.error(f"Start komandasi xatolik: {e}")
 
@@ -322,19 +431,12 @@ def cancel_command(message):
     else:
         bot.send_message(admin_id, "Bekor qilinadigan faol jarayon yo'q.")
 @bot.message_handler(func=lambda msg: msg.text == KEYBOARD_TEXTS['search'])
-def search_request(message):
+def search_request(message, ctx):
     try:
         user_id = message.from_user.id
         user_manager.add_user(user_id)
-        if not is_user_member(user_id):
-            prices = payment_manager.get_prices()
-            text = MEMBERSHIP_REQUIRED_MESSAGE.format(
-                channels="\n".join([f"📢 {ch.name}" for ch in channel_manager.get_channel_list_for_check()]),
-                week_price=prices['week'],
-                month_price=prices['month'],
-                year_price=prices['year']
-            )
-            bot.send_message(user_id, text, reply_markup=get_subscription_keyboard(), parse_mode='HTML')
+        if not is_user_member(ctx):
+            send_membership_required(ctx)
             return
 
         text = "Kinoni topish uchun uning nomini yoki kino kodini yozing.\n\nYoki ayrim kinolarni ko'rish uchun quyidagi tugmani bosing:"
@@ -345,70 +447,114 @@ def search_request(message):
     except Exception as e:
         logger.error(f"Qidiruv so'rovi xatolik: {e}")
 
+@bot.chat_member_handler()
+def handle_chat_member_update(update):
+    """Majburiy kanallardagi a'zolik o'zgarishlarini qayd etish (bot kanalda admin bo'lishi kerak)"""
+    try:
+        if not update.chat.username:
+            return
+        member = update.new_chat_member
+        channel_manager.record_member_update(update.chat.username, member.user.id, is_active_member(member))
+    except Exception as e:
+        logger.error(f"chat_member yangilanishini qayta ishlashda xatolik: {e}")
+
 @bot.callback_query_handler(func=lambda call: call.data == 'check_subscription')
-def check_subscription(call):
+def check_subscription(call, ctx):
     try:
         user_id = call.from_user.id
-        if is_user_member(user_id):
+        # Foydalanuvchi hozirgina obuna bo'lgan bo'lishi mumkin - keshdagi eski javobga ishonmaymiz
+        channel_manager.invalidate_membership(user_id)
+        if is_user_member(ctx):
             bot.answer_callback_query(call.id, "✅ Muvaffaqiyatli! Botdan foydalanishingiz mumkin.")
             # Xabarni o'chirib, asosiy menyuni yuboramiz
             bot.delete_message(call.message.chat.id, call.message.message_id)
-            bot.send_message(user_id, "Bosh menyu:", reply_markup=get_main_keyboard(user_id))
+            bot.send_message(user_id, "Bosh menyu:", reply_markup=get_main_keyboard(ctx))
         else:
             bot.answer_callback_query(call.id, "❌ Siz hali barcha kanallarga obuna bo'lmadingiz!", show_alert=True)
     except Exception as e:
         logger.error(f"Obuna tekshirishda xatolik: {e}")
 
 @bot.inline_handler(func=lambda query: True)
-def inline_search(query):
+def inline_search(query, ctx):
     try:
-        user_id = query.from_user.id
-        if not is_user_member(user_id):
+        if not is_user_member(ctx):
+            # is_personal: a'zo bo'lmaganlar uchun bo'sh javob boshqa foydalanuvchilarga keshlanmasin
             bot.answer_inline_query(query.id, [],
+                                    is_personal=True,
                                     switch_pm_text="Botdan foydalanish uchun kanallarga obuna bo'ling",
                                     switch_pm_parameter="subscribe")
             return
 
         search_query = query.query.strip().lower()
-
-        # Telegramdan kelayotgan offsetni olish
-        try:
-            # Offset bo'sh yoki mavjud bo'lmasligi mumkin
-            offset = int(query.offset) if query.offset else 0
-        except ValueError:
-            offset = 0
-
         limit = 50 # Telegram cheklovi
 
-        # Yangilangan funksiyani chaqirish
-        movies = movie_manager.search_movies(search_query, limit=limit, offset=offset)
+        # 1-3 harfli so'rovlar (har bir harf bosilganda keladi) prefiks indeksidan olinadi;
+        # ular bitta sahifa bo'lib, foydalanuvchi yozishda davom etganda oddiy qidiruvga o'tiladi.
+        movies = None
+        next_cursor = None
+        if not query.offset:
+            movies = movie_manager.autocomplete_movies(search_query, limit=limit)
+        if movies is None:
+            # Telegram next_offset orqali qaytargan keyset kursori (birinchi sahifada bo'sh)
+            movies, next_cursor = movie_manager.search_movies(search_query, limit=limit, cursor=query.offset or None)
+
+        # Botning o'z chatida (a'zo yoki premium) - video natijalar: tanlanganda video shu zahoti yuboriladi.
+        # Boshqa chatlarda /start havolasi qoladi, shunda u yerdagi foydalanuvchilar ham tekshiruvdan o'tadi.
+        send_videos = INLINE_VIDEO_RESULTS and query.chat_type == 'sender'
+        favorite_ids = favorites_manager.get_favorite_ids(ctx.user_id) if send_videos and movies else frozenset()
 
         results = []
         for movie in movies:
-            description = f"⭐ {movie.rating or 'N/A'} | 📅 {movie.year or 'N/A'} | 👁 {movie.views or 0}"
-            result = types.InlineQueryResultArticle(
-                id=str(movie.id),
-                title=movie.title,
-                description=description,
-                thumbnail_url=movie.poster_url or DEFAULT_POSTER_URL,
-                input_message_content=types.InputTextMessageContent(f"/start {movie.id}")
-            )
+            views = movie_manager.get_display_views(movie)
+            description = f"⭐ {movie.rating or 'N/A'} | 📅 {movie.year or 'N/A'} | 👁 {views}"
+            if send_videos:
+                caption, markup = movie_manager.render_cache.render_markup(movie, views, movie.id in favorite_ids)
+                result = types.InlineQueryResultCachedVideo(
+                    id=f"{INLINE_VIDEO_PREFIX}{movie.id}",
+                    video_file_id=movie.file_id,
+                    title=movie.title,
+                    description=description,
+                    caption=caption,
+                    parse_mode='HTML',
+                    reply_markup=markup
+                )
+            else:
+                result = types.InlineQueryResultArticle(
+                    id=str(movie.id),
+                    title=movie.title,
+                    description=description,
+                    thumbnail_url=movie.poster_url or DEFAULT_POSTER_URL,
+                    input_message_content=types.InputTextMessageContent(f"/start {movie.id}")
+                )
             results.append(result)
 
         # <<< "CHEKSIZ AYLANTIRISH" MANTIG'I >>>
-        next_offset = ""
-        # Agar bu safar topilgan natijalar soni limitga teng bo'lsa,
-        # demak, keyingi sahifada yana kinolar bo'lishi mumkin.
-        if len(results) == limit:
-            next_offset = str(offset + limit)
+        # Keyingi sahifa oxirgi natijaning tartiblash kalitidan boshlanadi, shuning uchun
+        # sahifa qanchalik chuqur bo'lmasin bir xil tezlikda olinadi.
+        next_offset = next_cursor or ""
 
+        # Video natijalar shaxsiy keshlanadi: aks holda a'zo bo'lmagan foydalanuvchi ham Telegram keshidan videoni olishi mumkin
         bot.answer_inline_query(query.id, results,
-                                cache_time=5,
+                                cache_time=INLINE_CACHE_TIME['text' if search_query else 'empty'],
+                                is_personal=send_videos,
                                 next_offset=next_offset) # <<< ENG MUHIM PARAMETR
 
     except Exception as e:
         logger.error(f"Inline qidiruvda kutilmagan xatolik: {e}", exc_info=True)
 
+@bot.chosen_inline_handler(func=lambda result: result.result_id.startswith(INLINE_VIDEO_PREFIX))
+def handle_chosen_inline_video(result):
+    """Inline video natija tanlandi - video allaqachon yuborilgan, faqat hisoblagichlar va jurnal"""
+    try:
+        movie_id = int(result.result_id[len(INLINE_VIDEO_PREFIX):])
+        user_id = result.from_user.id
+        movie_manager.update_views(movie_id)
+        user_manager.add_user(user_id)
+        user_manager.increment_movie_watch(user_id)
+        watch_log.record(user_id, movie_id, 'inline')
+    except Exception as e:
+        logger.error(f"Tanlangan inline natijani qayta ishlashda xatolik: {e}")
+
 def generate_movie_list_text(movies, list_title):
     """Kino ro'yxatini matn ko'rinishida formatlash (Movie obyektlari uchun)"""
     if not movies:
@@ -421,11 +567,11 @@ def generate_movie_list_text(movies, list_title):
     return text
 
 @bot.message_handler(func=lambda msg: msg.text == KEYBOARD_TEXTS['top_movies'])
-def handle_top_movies(message):
+def handle_top_movies(message, ctx):
     """Eng ommabop kinolar ro'yxatini yuborish"""
     user_id = message.from_user.id
-    if not is_user_member(user_id):
-        send_movie(user_id, -1) # Bu membership xabarini chiqaradi
+    if not is_user_member(ctx):
+        send_movie(ctx, -1) # Bu membership xabarini chiqaradi
         return
 
     bot.send_chat_action(user_id, 'typing')
@@ -434,11 +580,11 @@ def handle_top_movies(message):
     bot.send_message(user_id, text, parse_mode='HTML')
 
 @bot.message_handler(func=lambda msg: msg.text == KEYBOARD_TEXTS['latest_movies'])
-def handle_latest_movies(message):
+def handle_latest_movies(message, ctx):
     """Eng so'nggi qo'shilgan kinolar ro'yxatini yuborish"""
     user_id = message.from_user.id
-    if not is_user_member(user_id):
-        send_movie(user_id, -1)
+    if not is_user_member(ctx):
+        send_movie(ctx, -1)
         return
 
     bot.send_chat_action(user_id, 'typing')
@@ -447,11 +593,11 @@ def handle_latest_movies(message):
     bot.send_message(user_id, text, parse_mode='HTML')
 
 @bot.message_handler(func=lambda msg: msg.text == KEYBOARD_TEXTS['genres'])
-def handle_genres(message):
+def handle_genres(message, ctx):
     """Janrlar menyusini ko'rsatish"""
     user_id = message.from_user.id
-    if not is_user_member(user_id):
-        send_movie(user_id, -1)
+    if not is_user_member(ctx):
+        send_movie(ctx, -1)
         return
 
     bot.send_chat_action(user_id, 'typing')
@@ -481,13 +627,13 @@ def handle_genre_selection(call):
         logger.error(f"Janr bo'yicha kinolarni ko'rsatishda xatolik: {e}")
 
 @bot.message_handler(func=lambda msg: msg.text in [KEYBOARD_TEXTS['premium'], KEYBOARD_TEXTS['premium'] + " ✅"])
-def handle_premium(message):
+def handle_premium(message, ctx):
     try:
         user_id = message.from_user.id
         user_manager.add_user(user_id)
 
-        premium_info = payment_manager.get_premium_info(user_id)
-        if premium_info and premium_info.is_active:
+        if ctx.is_premium:
+            premium_info = payment_manager.get_premium_info(user_id)
             text = f"""✅ <b>Premium obuna faol!</b>
 
 📅 <b>Boshlangan sana:</b> {premium_info.start_date.strftime('%d.%m.%Y')}
@@ -516,7 +662,7 @@ def handle_premium(message):
         logger.error(f"Premium handle xatolik: {e}")
 
 @bot.message_handler(func=lambda msg: msg.from_user.id in ADMIN_IDS and msg.text in list(KEYBOARD_TEXTS.values()) + list(ADMIN_COMMANDS.values()))
-def handle_admin_keyboard(message):
+def handle_admin_keyboard(message, ctx):
     """Admin klaviatura handleri"""
     user_id = message.from_user.id
     text = message.text
@@ -525,7 +671,7 @@ def handle_admin_keyboard(message):
         bot.send_message(user_id, "⚙️ Admin Panel", reply_markup=get_admin_keyboard())
     elif text == KEYBOARD_TEXTS['back']:
         user_states.pop(user_id, None)
-        bot.send_message(user_id, "🏠 Asosiy menyu", reply_markup=get_main_keyboard(user_id))
+        bot.send_message(user_id, "🏠 Asosiy menyu", reply_markup=get_main_keyboard(ctx))
 
     elif text == ADMIN_COMMANDS['add_video']:
         bot.send_message(user_id, "📹 Qo'shmoqchi bo'lgan video faylni o'zbekcha sarlavha (caption) bilan yuboring.\n\n"
@@ -545,6 +691,9 @@ def handle_admin_keyboard(message):
             movie_stats = movie_manager.get_stats()
             user_stats = user_manager.get_user_stats()
             payment_stats = payment_manager.get_payment_stats()
+            search_cache_stats = movie_manager.get_search_cache_stats()
+            membership_cache_stats = channel_manager.get_membership_cache_stats()
+            delivery_stats = delivery_latency.stats()
 
             stats_text = f"""📊 <b>Bot Statistikasi</b>\n\n""" \
                          f"🎬 <b>Filmlar:</b>\n" \
@@ -557,7 +706,16 @@ def handle_admin_keyboard(message):
                          f"💰 <b>To'lovlar:</b>\n" \
                          f"  • Jami: {payment_stats['total_payments']}\n" \
                          f"  • Kutilmoqda: {payment_stats['pending_payments']}\n" \
-                         f"  • Jami daromad: {payment_stats['total_earned']:,} so'm"
+                         f"  • Jami daromad: {payment_stats['total_earned']:,} so'm\n\n" \
+                         f"⚡ <b>Qidiruv keshi:</b>\n" \
+                         f"  • Hajmi: {search_cache_stats['size']}\n" \
+                         f"  • Topildi/Topilmadi: {search_cache_stats['hits']}/{search_cache_stats['misses']} ({search_cache_stats['hit_rate']:.0%})\n\n" \
+                         f"🔐 <b>A'zolik keshi:</b>\n" \
+                         f"  • Hajmi: {membership_cache_stats['size']}\n" \
+                         f"  • Topildi/Topilmadi: {membership_cache_stats['hits']}/{membership_cache_stats['misses']} ({membership_cache_stats['hit_rate']:.0%})\n\n" \
+                         f"🎞 <b>Kino yuborish (send_video gacha):</b>\n" \
+                         f"  • Jami: {delivery_stats['count']}\n" \
+                         f"  • p50/p95/p99: {delivery_stats['p50_ms']}/{delivery_stats['p95_ms']}/{delivery_stats['p99_ms']} ms"
             bot.send_message(user_id, stats_text, parse_mode='HTML')
         except Exception as e:
             logger.error(f"Statistika olishda xatolik: {e}")
@@ -793,7 +951,8 @@ def handle_payment_proof(message):
             bot.send_message(user_id, "❌ Fayl qabul qilinmadi. Iltimos, rasm yoki PDF yuboring.")
             return
 
-        # Payment so'rovini bazada YARATAMIZ
+        # Payment so'rovini bazada YARATAMIZ (foydalanuvchi navbatda bo'lsa, avval u yoziladi)
+        user_manager.ensure_user_persisted(user_id)
         payment_id = payment_manager.create_payment_request(user_id, plan_type, amount, check_message_link=None)
         if not payment_id:
             bot.send_message(user_id, "❌ To'lov so'rovini yaratishda xatolik yuz berdi.")
@@ -934,24 +1093,27 @@ def handle_toggle_favorite(call):
         user_id = call.from_user.id
         movie_id = int(call.data.split('_')[1])
 
-        # Sevimlilarga qo'shish/olib tashlash
+        # Sevimlilarga qo'shish/olib tashlash (yangi foydalanuvchi avval bazaga yozilishi kerak)
+        user_manager.ensure_user_persisted(user_id)
         action_is_add = favorites_manager.toggle_favorite(user_id, movie_id)
 
-        # Tugmani yangilash
-        favorite_text = "💔 Olib tashlash" if action_is_add else "❤️ Sevimlilarga qo'shish"
-
-        # Xabardagi barcha tugmalarni qayta chizamiz
-        keyboard = types.InlineKeyboardMarkup()
-        keyboard.add(types.InlineKeyboardButton(favorite_text, callback_data=f"fav_{movie_id}"))
-        # Eski ulashish va qidirish tugmalarini ham qo'shamiz
-        # Bu yerda biz kino nomini bilmaymiz, shuning uchun soddaroq qilamiz
-        # Yaxshiroq usul - kino nomini callback_data ga qo'shish, lekin hozircha shunday qoldiramiz
-        keyboard.add(
-            types.InlineKeyboardButton("↪️ Ulashish", switch_inline_query=""),
-            types.InlineKeyboardButton("🔎 Boshqa kinolar", switch_inline_query_current_chat="")
-        )
+        # Tugmani yangilash: kino keshda bo'lsa tayyor tugmalar (ulashish tugmasi kino nomi bilan)
+        keyboard = movie_manager.render_cache.get_keyboard(movie_id, action_is_add)
+        if keyboard is None:
+            favorite_text = "💔 Olib tashlash" if action_is_add else "❤️ Sevimlilarga qo'shish"
+            keyboard = types.InlineKeyboardMarkup()
+            keyboard.add(types.InlineKeyboardButton(favorite_text, callback_data=f"fav_{movie_id}"))
+            # Bu yerda kino nomini bilmaymiz, shuning uchun ulashish tugmasi bo'sh so'rov bilan
+            keyboard.add(
+                types.InlineKeyboardButton("↪️ Ulashish", switch_inline_query=""),
+                types.InlineKeyboardButton("🔎 Boshqa kinolar", switch_inline_query_current_chat="")
+            )
 
-        bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id, reply_markup=keyboard)
+        if call.message:
+            bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id, reply_markup=keyboard)
+        else:
+            # Inline natija orqali yuborilgan video - xabar faqat inline_message_id bilan tahrirlanadi
+            bot.edit_message_reply_markup(inline_message_id=call.inline_message_id, reply_markup=keyboard)
 
         alert_text = "✅ Sevimlilarga qo'shildi!" if action_is_add else "🗑️ Sevimlilardan olib tashlandi."
         bot.answer_callback_query(call.id, alert_text)
@@ -979,12 +1141,12 @@ def handle_show_favorites(message):
         movie = movie_manager.get_movie(movie_id)
         if movie:
             text += f"<b>{i}. {movie.title}</b> ({movie.year or 'N/A'})\n"
-            text += f"Ko'rish uchun kod: <code>{movie.id}</code>\n\n"
+            text += f"Ko'rish uchun kod: <code>{movie.id}</code> | <a href='https://t.me/{BOT_USERNAME.replace('@', '')}?start=fav{movie.id}'>▶️ Ko'rish</a>\n\n"
         else:
             # Agar kino bazadan o'chirilgan bo'lsa
             text += f"<b>{i}.</b> <i>(Bu kino o'chirilgan)</i>\n\n"
 
-    bot.send_message(user_id, text, parse_mode='HTML')
+    bot.send_message(user_id, text, parse_mode='HTML', disable_web_page_preview=True)
 
 def get_channels_management_keyboard():
     """Kanallarni boshqarish uchun inline klaviatura"""
@@ -1154,33 +1316,26 @@ def handle_admin_states(message):
         user_states.pop(user_id, None)
 
 @bot.message_handler(func=lambda msg: msg.text and msg.text.isdigit())
-def handle_id_message(message):
+def handle_id_message(message, ctx):
     """ID bo'yicha film topish"""
     # Agar admin biror state da bo'lsa, bu funksiya ishlamaydi
     if user_states.get(message.from_user.id):
         return
-    send_movie(message.chat.id, int(message.text))
+    send_movie(ctx, int(message.text), source='code')
 
 @bot.message_handler(content_types=['text'])
-def handle_text_message(message):
+def handle_text_message(message, ctx):
     """Barcha boshqa matnli xabarlar (qidiruv uchun)"""
     if user_states.get(message.from_user.id):
         return
 
     user_id = message.from_user.id
     user_manager.add_user(user_id)
-    if user_manager.is_banned(user_id):
+    if ctx.is_banned:
         return
 
-    if not is_user_member(user_id):
-        prices = payment_manager.get_prices()
-        text = MEMBERSHIP_REQUIRED_MESSAGE.format(
-            channels="\n".join([f"📢 {ch.name}" for ch in channel_manager.get_channel_list_for_check()]),
-            week_price=prices['week'],
-            month_price=prices['month'],
-            year_price=prices['year']
-        )
-        bot.send_message(user_id, text, reply_markup=get_subscription_keyboard(), parse_mode='HTML')
+    if not is_user_member(ctx):
+        send_membership_required(ctx)
         return
 
     keyboard = types.InlineKeyboardMarkup([[
@@ -1188,10 +1343,22 @@ def handle_text_message(message):
     ]])
     bot.send_message(user_id, f"Natijalarni ko'rish uchun tugmani bosing:", reply_markup=keyboard)
 
+# chat_member va chosen_inline_result yangilanishlari faqat so'ralganda yuboriladi
+ALLOWED_UPDATES = ['message', 'callback_query', 'inline_query', 'chosen_inline_result', 'chat_member']
+
 def main():
     try:
         logger.info("Ma'lumotlar bazasi jadvallari tekshirilmoqda...")
         init_db() # Dastur ishga tushganda jadvallarni yaratadi
+        movie_manager.load_catalog() # Xotiradagi qidiruv indekslari va menyu ro'yxatlarini qurish
+        movie_manager.start_catalog_reconciler()
+        payment_manager.start_premium_sweeper() # Muddati tugagan obunalarni fon rejimida o'chirish
+        user_manager.start_user_flusher() # Foydalanuvchi upsertlarini guruhlab yozish
+        movie_manager.start_views_flusher() # Ko'rishlar sonini guruhlab yozish
+        watch_log.start_writer() # Ko'rishlar jurnalini guruhlab yozish
+        signal.signal(signal.SIGTERM, lambda signum, frame: bot.stop_polling())
+        # Tugallanmagan (hech bir jarayon yubormayotgan) broadcastlar kursordan davom ettiriladi
+        broadcast_manager.start_broadcast_resumer(bot, get_broadcast_recipients, resume_broadcast_progress_reporter)
 
         for admin_id in ADMIN_IDS:
              try:
@@ -1200,11 +1367,22 @@ def main():
                  logger.warning(f"Adminga ({admin_id}) xabar yuborib bo'lmadi: {e}")
 
         logger.info("Bot ishlayapti...")
-        bot.infinity_polling(timeout=60, long_polling_timeout=60)
+        bot.infinity_polling(timeout=60, long_polling_timeout=60, allowed_updates=ALLOWED_UPDATES)
     except Exception as e:
         logger.critical(f"Botning ishlashida jiddiy xatolik: {e}", exc_info=True)
         time.sleep(15)
         # main() # Avtomatik qayta ishga tushirishni vaqtincha o'chiramiz, xatoni ko'rish uchun
+    finally:
+        shutdown()
+
+def shutdown():
+    """To'xtashdan oldin xotiradagi navbatlarni bazaga yozish"""
+    broadcast_manager.suspend_all() # Kursor saqlanadi, keyingi ishga tushishda davom ettiriladi
+    flushed = user_manager.flush_pending_users()
+    user_manager.flush_watch_counts()
+    movie_manager.flush_view_counts()
+    watch_log.flush()
+    logger.info(f"Bot to'xtatildi. Navbatdagi {flushed} ta foydalanuvchi va hisoblagichlar yozildi.")
 
 if __name__ == '__main__':
     main()
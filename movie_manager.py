@@ -1,16 +1,155 @@
 # movie_manager.py (YAKUNIY VARIANT)
 
 import logging
+import threading
+import time
+from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
+from sqlalchemy import desc, func, case, or_, tuple_
 from sqlalchemy.exc import IntegrityError
-from database import Movie, SessionLocal
+from database import Movie, Genre, MovieGenre, Favorite, SessionLocal, is_trgm_available
+from search_index import MovieSearchIndex, EXACT_MATCH_BOOST, PREFIX_MATCH_BOOST
+from fuzzy_index import FuzzyTitleIndex
+from autocomplete import TitleAutocomplete, MAX_PREFIX_LENGTH
+from catalog_views import CatalogViews
+from text_normalizer import normalize_text, build_search_key, split_genres, SEARCH_KEY_SEPARATOR
+from ttl_cache import TTLCache
+from counter_buffer import CounterBuffer, bulk_increment
+from movie_render import MovieRenderCache
+from config import SEARCH_BACKEND, SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL, CATALOG_RECONCILE_INTERVAL, COUNTER_FLUSH_INTERVAL
 
 logger = logging.getLogger(__name__)
 
+# Keyset kursori qismlari orasidagi ajratuvchi (Telegram next_offset 64 baytgacha)
+CURSOR_SEPARATOR = "|"
+
+# Kursor turlari: har bir sahifalash tartibi uchun kalit qismlarining turlari.
+# Kalitlar sahifalar orasida o'zgarmaydigan qiymatlardan tuziladi (ko'rishlar soni kirmaydi).
+LATEST_CURSOR = (datetime.fromisoformat, int)      # (added_date, id)
+RANKED_CURSOR = (float, int)                       # (score, id)
+
+def _escape_like(value: str):
+    """LIKE shablonidagi maxsus belgilarni (%, _) ekranlash"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def encode_cursor(*values):
+    """Oxirgi ko'rsatilgan qatorning tartiblash kalitini matnli kursorga aylantirish"""
+    parts = []
+    for value in values:
+        if isinstance(value, datetime):
+            parts.append(value.isoformat())
+        elif isinstance(value, float):
+            parts.append(repr(value))  # repr() float qiymatini aniq qayta tiklaydi
+        else:
+            parts.append(str(value))
+    return CURSOR_SEPARATOR.join(parts)
+
+def decode_cursor(cursor: str, types):
+    """Kursorni kalit qiymatlariga qaytarish. Noto'g'ri kursor bo'lsa ValueError."""
+    parts = cursor.split(CURSOR_SEPARATOR)
+    if len(parts) != len(types):
+        raise ValueError(f"Noto'g'ri kursor: {cursor!r}")
+    return tuple(cast(part) for cast, part in zip(types, parts))
+
+def _keyset_page(rows, limit: int):
+    """
+    rows - limit + 1 tagacha (kino, tartiblash_kaliti) juftliklari.
+    Ortiqcha qator bo'lsa, keyingi sahifa bor va kursor oxirgi ko'rsatilgan qatordan olinadi.
+    """
+    page = rows[:limit]
+    next_cursor = encode_cursor(*page[-1][1]) if len(rows) > limit and page else None
+    return [movie for movie, _ in page], next_cursor
+
 class MovieManager:
-    def __init__(self):
-        pass
+    def __init__(self, search_backend: str = SEARCH_BACKEND):
+        # "memory" - qidiruv xotiradagi indeks orqali, "sql" - har safar bazaga so'rov
+        self.search_backend = search_backend
+        self.search_index = MovieSearchIndex() if search_backend == "memory" else None
+        # Natija topilmaganda imlo xatolarini hisobga oluvchi zaxira qidiruv (ikkala rejimda ham)
+        self.fuzzy_index = FuzzyTitleIndex()
+        # Qisqa (1-3 harfli) inline so'rovlar uchun prefiks bo'yicha avtoto'ldirish
+        self.autocomplete = TitleAutocomplete()
+        # Menyu ro'yxatlari (top, yangi, janrlar) xotirada - tugma bosilganda bazaga murojaat yo'q
+        self.catalog_views = CatalogViews()
+        self._reconcile_thread = None
+        # Ko'rishlar soni darhol bazaga yozilmaydi: {movie_id: delta} davriy ravishda bitta UPDATE bilan yoziladi
+        self.view_counter = CounterBuffer()
+        self._views_flusher_thread = None
+        # Bir xil (normallashtirilgan) so'rovlar uchun natijalar keshi
+        self.search_cache = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+        # Katalog har o'zgarganda oshadi; eski versiyada hisoblangan natija keshga yozilmaydi
+        self.catalog_version = 0
+        # Yuboriladigan kinolarning tayyor caption va tugmalari
+        self.render_cache = MovieRenderCache()
+
+    def load_catalog(self):
+        """Xotiradagi qidiruv indekslari va menyu ro'yxatlarini bazadagi barcha kinolardan qurish (bot ishga tushganda)"""
+        with SessionLocal() as db:
+            try:
+                movies = db.query(Movie).all()
+            except Exception as e:
+                logger.error(f"Qidiruv indeksini qurishda xatolik: {e}")
+                return False
+        if self.search_index is not None:
+            self.search_index.build(movies)
+        self.fuzzy_index.build(movies)
+        self.autocomplete.build(movies)
+        self.catalog_views.build(movies)
+        # Bazaga hali yozilmagan ko'rishlar yangi indekslarga ham qo'shiladi
+        for movie_id, delta in self.view_counter.pending_items().items():
+            self._increment_index_views(movie_id, delta)
+        self.catalog_version += 1
+        self.search_cache.clear()
+        return True
+
+    def reconcile_catalog(self):
+        """
+        Barcha xotiradagi indekslar (qidiruv, imlo xatolari, avtoto'ldirish) va menyu ro'yxatlarini
+        bazadagi haqiqiy holat bilan moslashtirish (boshqa jarayonlardagi o'zgarishlar uchun)
+        """
+        self.flush_view_counts() # Yig'ilgan ko'rishlar ham hisobga olinishi uchun
+        return self.load_catalog()
+
+    def start_catalog_reconciler(self, interval: int = CATALOG_RECONCILE_INTERVAL):
+        """Katalogni har interval soniyada moslashtiruvchi fon oqimini ishga tushirish"""
+        if self._reconcile_thread is not None or interval <= 0:
+            return
+
+        def reconcile_loop():
+            while True:
+                time.sleep(interval)
+                self.reconcile_catalog()
+
+        self._reconcile_thread = threading.Thread(target=reconcile_loop, name="catalog-reconciler", daemon=True)
+        self._reconcile_thread.start()
+
+    def _on_movie_added(self, movie):
+        """Katalogga kino qo'shilgandan keyin xotiradagi tuzilmalarni yangilash"""
+        self.catalog_version += 1
+        self.search_cache.clear()
+        self.render_cache.invalidate(movie.id)
+        if self.search_index is not None and self.search_index.is_ready():
+            self.search_index.add(movie)
+        if self.fuzzy_index.is_ready():
+            self.fuzzy_index.add(movie)
+        if self.autocomplete.is_ready():
+            self.autocomplete.add(movie)
+        if self.catalog_views.is_ready():
+            self.catalog_views.add(movie)
+
+    def _on_movie_deleted(self, movie_id: int):
+        """Katalogdan kino o'chirilgandan keyin xotiradagi tuzilmalarni yangilash"""
+        self.catalog_version += 1
+        self.search_cache.clear()
+        self.render_cache.invalidate(movie_id)
+        if self.search_index is not None and self.search_index.is_ready():
+            self.search_index.remove(movie_id)
+        if self.fuzzy_index.is_ready():
+            self.fuzzy_index.remove(movie_id)
+        if self.autocomplete.is_ready():
+            self.autocomplete.remove(movie_id)
+        if self.catalog_views.is_ready():
+            self.catalog_views.remove(movie_id)
 
 
     def add_movie(self, movie_data: dict):
@@ -30,12 +169,16 @@ class MovieManager:
                     poster_url=movie_data.get('poster_url'),
                     genres=movie_data.get('genres'),
                     countries=movie_data.get('countries'),
-                    tmdb_id=movie_data.get('tmdb_id')
+                    tmdb_id=movie_data.get('tmdb_id'),
+                    search_key=build_search_key(movie_data.get('title'), movie_data.get('original_title'))
                 )
                 db.add(new_movie)
+                db.flush()
+                self._link_genres(db, new_movie.id, split_genres(movie_data.get('genres')))
                 db.commit()
                 db.refresh(new_movie)
                 logger.info(f"Film bazaga qo'shildi: ID {new_movie.id}, Nomi: {new_movie.title}")
+                self._on_movie_added(new_movie)
                 return new_movie.id
             except IntegrityError:
                 db.rollback()
@@ -48,6 +191,24 @@ class MovieManager:
                 logger.error(f"Film qo'shishda xatolik: {e}", exc_info=True)
                 return None
 
+    def _link_genres(self, db: Session, movie_id: int, genre_names):
+        """Kinoni janrlar bilan bog'lash (mavjud bo'lmagan janrlar yaratiladi). Commit chaqiruvchida."""
+        if not genre_names:
+            return
+        genre_ids = {name: genre_id for genre_id, name in db.query(Genre.id, Genre.name).filter(Genre.name.in_(genre_names))}
+        for name in genre_names:
+            if name in genre_ids:
+                continue
+            try:
+                # Bir vaqtda ikki admin bir xil yangi janrni qo'shsa, unique cheklovi himoya qiladi
+                with db.begin_nested():
+                    genre = Genre(name=name)
+                    db.add(genre)
+                genre_ids[name] = genre.id
+            except IntegrityError:
+                genre_ids[name] = db.query(Genre.id).filter(Genre.name == name).scalar()
+        db.add_all(MovieGenre(movie_id=movie_id, genre_id=genre_ids[name]) for name in genre_names)
+
     def get_movie(self, movie_id: int):
         with SessionLocal() as db:
             try:
@@ -56,6 +217,19 @@ class MovieManager:
                 logger.error(f"Film olishda xatolik (ID: {movie_id}): {e}")
                 return None
 
+    def get_movie_for_delivery(self, movie_id: int, user_id: int):
+        """Kino yuborish uchun bitta so'rov: (Movie yoki None, foydalanuvchi sevimlilarida bormi)"""
+        with SessionLocal() as db:
+            try:
+                is_favorite = db.query(Favorite).filter(
+                    Favorite.user_id == user_id, Favorite.movie_id == Movie.id
+                ).exists().label("is_favorite")
+                row = db.query(Movie, is_favorite).filter(Movie.id == movie_id).first()
+                return (row.Movie, bool(row.is_favorite)) if row else (None, False)
+            except Exception as e:
+                logger.error(f"Yuboriladigan filmni olishda xatolik (ID: {movie_id}): {e}")
+                return None, False
+
     def get_movie_by_file_id(self, file_id: str):
         """Filmni unikal file_id bo'yicha bazadan qidirish"""
         with SessionLocal() as db:
@@ -66,25 +240,61 @@ class MovieManager:
                 return None
 
     def update_views(self, movie_id: int):
+        """Ko'rishni xotiradagi indekslarga darhol, bazaga esa keyinroq (flush_view_counts) qo'shish"""
+        self.view_counter.add(movie_id)
+        self._increment_index_views(movie_id)
+        return True
+
+    def _increment_index_views(self, movie_id: int, delta: int = 1):
+        if self.search_index is not None:
+            self.search_index.increment_views(movie_id, delta)
+        self.fuzzy_index.increment_views(movie_id, delta)
+        self.autocomplete.increment_views(movie_id, delta)
+        self.catalog_views.increment_views(movie_id, delta)
+
+    def get_pending_views(self, movie_id: int):
+        """Bazaga hali yozilmagan ko'rishlar (ko'rsatiladigan son = movie.views + shu qiymat)"""
+        return self.view_counter.pending(movie_id)
+
+    def get_display_views(self, movie):
+        """
+        Ko'rsatiladigan ko'rishlar soni. Qidiruv indeksidagi (umumiy) obyekt uchun indeksdagi son -
+        unda yozilmagan ko'rishlar allaqachon bor; bazadan yangi olingan obyekt uchun movie.views + yozilmaganlar.
+        """
+        if self.search_index is not None and self.search_index.get(movie.id) is movie:
+            views = self.search_index.get_views(movie.id)
+            if views is not None:
+                return views
+        return (movie.views or 0) + self.get_pending_views(movie.id)
+
+    def flush_view_counts(self):
+        """Yig'ilgan ko'rishlarni bitta bulk UPDATE bilan yozish; yangilangan kinolar sonini qaytaradi"""
+        deltas = self.view_counter.drain()
+        if not deltas:
+            return 0
         with SessionLocal() as db:
             try:
-                # To'g'ridan-to'g'ri UPDATE so'rovi - bu ancha tezroq
-                result = db.query(Movie).filter(Movie.id == movie_id).update(
-                    {Movie.views: Movie.views + 1},
-                    synchronize_session=False
-                )
+                updated = len(bulk_increment(db, Movie, Movie.id, Movie.views, deltas))
                 db.commit()
-                if result > 0:
-                    # Yangi qiymatni bilish shart bo'lsa, uni alohida so'rov bilan olamiz.
-                    # Lekin ko'pincha bu shart emas. Agar kerak bo'lsa, quyidagi qatorni oching.
-                    # new_views = db.query(Movie.views).filter(Movie.id == movie_id).scalar()
-                    # return new_views
-                    return True # Muvaffaqiyatli yangilanganini bildiradi
-                return False
+                return updated
             except Exception as e:
                 db.rollback()
+                self.view_counter.restore(deltas)
                 logger.error(f"Ko'rishlar sonini yangilashda xatolik: {e}")
-                return False
+                return 0
+
+    def start_views_flusher(self, interval: float = COUNTER_FLUSH_INTERVAL):
+        """flush_view_counts ni har interval soniyada ishga tushiruvchi fon oqimi"""
+        if self._views_flusher_thread is not None or interval <= 0:
+            return
+
+        def flush_loop():
+            while True:
+                time.sleep(interval)
+                self.flush_view_counts()
+
+        self._views_flusher_thread = threading.Thread(target=flush_loop, name="views-flusher", daemon=True)
+        self._views_flusher_thread.start()
 
     def get_all_movies(self, limit=50):
         with SessionLocal() as db:
@@ -94,36 +304,150 @@ class MovieManager:
                 logger.error(f"Barcha filmlarni olishda xatolik: {e}")
                 return []
 
-    def search_movies(self, query: str, limit: int = 50, offset: int = 0):
+    def search_movies(self, query: str, limit: int = 50, cursor: str = None):
+        """
+        Kinolarni qidirish (keyset sahifalash bilan).
+        Natija: (kinolar ro'yxati, keyingi sahifa kursori yoki None).
+        """
+        # Kirill/lotin, apostrof va transliteratsiya farqlari shu yerda bir xil shaklga keltiriladi
+        query = normalize_text(query)
+        cache_key = (query, cursor, limit)
+        cached = self.search_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        version = self.catalog_version
+        movies, next_cursor = self._search_movies(query, limit, cursor)
+        if not movies and not cursor and query and not query.isdigit():
+            movies, next_cursor = self._fuzzy_search(query, limit), None
+        if movies and version == self.catalog_version:
+            self.search_cache.set(cache_key, (movies, next_cursor))
+        return movies, next_cursor
+
+    def get_search_cache_stats(self):
+        return self.search_cache.stats()
+
+    def _search_movies(self, query: str, limit: int, cursor: str = None):
+        try:
+            if self.search_index is not None and self.search_index.is_ready():
+                after = decode_cursor(cursor, RANKED_CURSOR if query else LATEST_CURSOR) if cursor else None
+                rows = self.search_index.search(query, limit=limit + 1, after=after)
+                return _keyset_page(rows, limit)
+        except ValueError as e:
+            logger.warning(f"Qidiruv kursori noto'g'ri: {e}")
+            return [], None
+
         with SessionLocal() as db:
             try:
-                query = query.lower().strip()
-                search_query = db.query(Movie)
-
-                if query.isdigit() and offset == 0:
-                    movie_by_id = search_query.filter(Movie.id == int(query)).first()
+                if query.isdigit() and not cursor:
+                    movie_by_id = db.query(Movie).filter(Movie.id == int(query)).first()
                     if movie_by_id:
-                        return [movie_by_id]
+                        return [movie_by_id], None
 
                 if query:
-                    search_filter = f"%{query}%"
-                    search_query = search_query.filter(
-                        (Movie.title.ilike(search_filter)) |
-                        (Movie.original_title.ilike(search_filter))
-                    )
-
-                results = search_query.order_by(desc(Movie.added_date)).offset(offset).limit(limit).all()
-                logger.debug(f"Qidiruv natijasi: {len(results)} film topildi (so'rov: '{query}', offset: {offset})")
-                return results
+                    search_query = self._build_search_query(db, query, cursor)
+                    rows = [(row[0], tuple(row[1:])) for row in search_query.limit(limit + 1).all()]
+                else:
+                    movies = self._latest_query(db, cursor).limit(limit + 1).all()
+                    rows = [(movie, (movie.added_date, movie.id)) for movie in movies]
+
+                logger.debug(f"Qidiruv natijasi: {len(rows)} film topildi (so'rov: '{query}', kursor: {cursor})")
+                return _keyset_page(rows, limit)
+            except ValueError as e:
+                logger.warning(f"Qidiruv kursori noto'g'ri: {e}")
+                return [], None
             except Exception as e:
                 logger.error(f"Qidirishda xatolik: {e}")
+                return [], None
+
+    def autocomplete_movies(self, prefix: str, limit: int = 50):
+        """
+        Qisqa prefiks (1-3 harf) bilan boshlanadigan so'zi bor eng ko'p ko'rilgan kinolar.
+        Indeks tayyor bo'lmasa, so'rovda bo'sh joy bo'lsa yoki prefiks mos kelmasa None qaytaradi
+        (oddiy qidiruv va imlo xatolari bo'yicha qidiruvga o'tiladi).
+        """
+        prefix = normalize_text(prefix)
+        if (not self.autocomplete.is_ready() or not prefix or prefix.isdigit()
+                or ' ' in prefix or len(prefix) > MAX_PREFIX_LENGTH):
+            return None
+        movie_ids = self.autocomplete.complete(prefix, limit=limit)
+        if not movie_ids:
+            return None
+        return self._movies_by_ids(movie_ids) or None
+
+    def _fuzzy_search(self, query: str, limit: int):
+        """Hech narsa topilmaganda imlo xatolarini hisobga olib qidirish (faqat birinchi sahifa)"""
+        if not self.fuzzy_index.is_ready():
+            return []
+        return self._movies_by_ids(self.fuzzy_index.lookup(query, limit=limit))
+
+    def _movies_by_ids(self, movie_ids):
+        """ID lar ro'yxatidagi kinolarni shu tartibda olish (xotiradagi indeksdan yoki bitta so'rov bilan)"""
+        if not movie_ids:
+            return []
+
+        if self.search_index is not None and self.search_index.is_ready():
+            return [movie for movie in map(self.search_index.get, movie_ids) if movie is not None]
+
+        with SessionLocal() as db:
+            try:
+                movies = {movie.id: movie for movie in db.query(Movie).filter(Movie.id.in_(movie_ids)).all()}
+                return [movies[movie_id] for movie_id in movie_ids if movie_id in movies]
+            except Exception as e:
+                logger.error(f"Kinolarni ID lar bo'yicha olishda xatolik: {e}")
                 return []
 
+    def _build_search_query(self, db: Session, query: str, cursor: str = None):
+        """
+        Relevantlik bo'yicha tartiblangan qidiruv so'rovini yaratish.
+        query allaqachon normallashtirilgan va Movie.search_key bilan solishtiriladi.
+        pg_trgm mavjud bo'lsa GIN indeksi va o'xshashlik bahosi ishlatiladi,
+        aks holda (masalan, SQLite) oddiy LIKE bilan ishlaydi.
+        So'rov (Movie, *tartiblash_kaliti) qatorlarini qaytaradi.
+        """
+        escaped = _escape_like(query)
+        search_key = Movie.search_key
+
+        # search_key = "nom | asl nom", shuning uchun ikkala qism ham tekshiriladi
+        exact_score = case((or_(
+            search_key == query,
+            search_key.like(f"{escaped}{SEARCH_KEY_SEPARATOR}%", escape='\\'),
+            search_key.like(f"%{SEARCH_KEY_SEPARATOR}{escaped}", escape='\\')
+        ), EXACT_MATCH_BOOST), else_=0.0)
+        prefix_score = case((or_(
+            search_key.like(f"{escaped}%", escape='\\'),
+            search_key.like(f"%{SEARCH_KEY_SEPARATOR}{escaped}%", escape='\\')
+        ), PREFIX_MATCH_BOOST), else_=0.0)
+        substring_filter = search_key.like(f"%{escaped}%", escape='\\')
+
+        if is_trgm_available():
+            # "%" operatori ham, LIKE ham trigram GIN indeksidan foydalanadi.
+            similarity_score = func.similarity(search_key, query)
+            sort_key = (exact_score + prefix_score + similarity_score, Movie.id)
+            match_filter = or_(substring_filter, search_key.op('%')(query))
+        else:
+            sort_key = (exact_score + prefix_score, Movie.id)
+            match_filter = substring_filter
+
+        search_query = db.query(Movie, *sort_key).filter(match_filter)
+        if cursor:
+            search_query = search_query.filter(tuple_(*sort_key) < tuple_(*decode_cursor(cursor, RANKED_CURSOR)))
+        return search_query.order_by(*[desc(column) for column in sort_key])
+
+    def _latest_query(self, db: Session, cursor: str = None):
+        """Yangi qo'shilganlar tartibi: (added_date, id) bo'yicha kamayish, kursordan keyin"""
+        latest_query = db.query(Movie)
+        if cursor:
+            after = decode_cursor(cursor, LATEST_CURSOR)
+            latest_query = latest_query.filter(tuple_(Movie.added_date, Movie.id) < tuple_(*after))
+        return latest_query.order_by(desc(Movie.added_date), desc(Movie.id))
+
     def get_stats(self):
         with SessionLocal() as db:
             try:
                 total_movies = db.query(func.count(Movie.id)).scalar()
                 total_views = db.query(func.sum(Movie.views)).scalar() or 0
+                total_views += sum(self.view_counter.pending_items().values()) # Hali yozilmaganlari
                 return {"total_movies": total_movies, "total_views": total_views}
             except Exception as e:
                 logger.error(f"Statistika olishda xatolik: {e}")
@@ -137,9 +461,11 @@ class MovieManager:
                 if not movie_title:
                     return False, f"❌ ID si {movie_id} bo'lgan kino topilmadi."
 
-                # To'g'ridan-to'g'ri DELETE so'rovi
+                # To'g'ridan-to'g'ri DELETE so'rovi (SQLite da ON DELETE CASCADE ishlamagani uchun bog'lanishlar ham)
+                db.query(MovieGenre).filter(MovieGenre.movie_id == movie_id).delete(synchronize_session=False)
                 db.query(Movie).filter(Movie.id == movie_id).delete(synchronize_session=False)
                 db.commit()
+                self._on_movie_deleted(movie_id)
 
                 logger.info(f"Film o'chirildi: ID {movie_id}, Nomi: {movie_title}")
                 return True, f"✅ '{movie_title}' nomli kino (ID: {movie_id}) muvaffaqiyatli o'chirildi."
@@ -149,6 +475,8 @@ class MovieManager:
                 return False, "❌ Kinoni o'chirishda kutilmagan xatolik yuz berdi."
 
     def get_top_movies(self, limit=10):
+        if self.catalog_views.is_ready() and limit <= self.catalog_views.size:
+            return self.catalog_views.top(limit)
         with SessionLocal() as db:
             try:
                 return db.query(Movie).order_by(desc(Movie.views)).limit(limit).all()
@@ -157,32 +485,39 @@ class MovieManager:
                 return []
 
     def get_latest_movies(self, limit=10):
+        """Eng yangi kinolar"""
+        if self.catalog_views.is_ready() and limit <= self.catalog_views.size:
+            return self.catalog_views.latest(limit)
         with SessionLocal() as db:
             try:
-                return db.query(Movie).order_by(desc(Movie.added_date)).limit(limit).all()
+                return self._latest_query(db).limit(limit).all()
             except Exception as e:
                 logger.error(f"Yangi kinolarni olishda xatolik: {e}")
                 return []
 
     def get_all_genres(self):
+        """Kamida bitta kinosi bor janrlar nomlari (alifbo tartibida)"""
+        if self.catalog_views.is_ready():
+            return self.catalog_views.genres()
         with SessionLocal() as db:
             try:
-                results = db.query(Movie.genres).filter(Movie.genres != None).distinct().all()
-                all_genres = set()
-                for (genre_str,) in results:
-                    if genre_str:
-                        genres = [g.strip() for g in genre_str.split(',')]
-                        all_genres.update(g for g in genres if g) # Bo'sh janrlarni o'tkazib yuborish
-                return sorted(list(all_genres))
+                has_movies = db.query(MovieGenre).filter(MovieGenre.genre_id == Genre.id).exists()
+                return [name for (name,) in db.query(Genre.name).filter(has_movies).order_by(Genre.name).all()]
             except Exception as e:
                 logger.error(f"Janrlarni olishda xatolik: {e}")
                 return []
 
     def get_movies_by_genre(self, genre_name, limit=10):
+        """Janr bo'yicha ommabop kinolar (janr nomi aniq mos kelishi kerak, "Drama" != "Melodrama")"""
+        if self.catalog_views.is_ready() and limit <= self.catalog_views.size:
+            return self.catalog_views.by_genre(genre_name, limit)
         with SessionLocal() as db:
             try:
-                search_filter = f"%{genre_name}%"
-                return db.query(Movie).filter(Movie.genres.ilike(search_filter)).order_by(desc(Movie.views)).limit(limit).all()
+                views = func.coalesce(Movie.views, 0)
+                genre_query = db.query(Movie).join(MovieGenre, MovieGenre.movie_id == Movie.id).join(
+                    Genre, Genre.id == MovieGenre.genre_id
+                ).filter(Genre.name == genre_name)
+                return genre_query.order_by(desc(views), desc(Movie.id)).limit(limit).all()
             except Exception as e:
                 logger.error(f"Janr bo'yicha kinolarni olishda xatolik: {e}")
                 return []
@@ -0,0 +1,93 @@
+# movie_render.py
+from telebot import types
+
+from ttl_cache import TTLCache
+from config import BOT_USERNAME, MOVIE_RENDER_CACHE_SIZE, MOVIE_RENDER_CACHE_TTL
+
+FAVORITE_ADD_TEXT = "❤️ Sevimlilarga qo'shish"
+FAVORITE_REMOVE_TEXT = "💔 Sevimlilardan olib tashlash"
+
+
+def content_version(movie):
+    """Caption va tugmalarga ta'sir qiluvchi maydonlar - o'zgarsa keshdagi yozuv eskirgan hisoblanadi"""
+    return (movie.title, movie.original_title, movie.countries, movie.genres, movie.year, movie.rating)
+
+
+def render_caption_parts(movie):
+    """Caption ning o'zgarmas qismlari: (ko'rishlar sonigacha, ko'rishlar sonidan keyin)"""
+    head = f"🎬 <b>{movie.title}</b>"
+    if movie.original_title and movie.original_title.lower() != movie.title.lower():
+        head += f" ({movie.original_title})"
+    head += f"\n➖➖➖➖➖➖➖➖➖➖\n"
+    if movie.countries:
+        head += f"🌍 Davlat: {movie.countries}\n"
+    if movie.genres:
+        head += f"🎭 Janr: {' '.join(['#' + g.strip().replace(' ', '') for g in movie.genres.split(',')])}\n"
+    if movie.year:
+        head += f"📆 Yil: {movie.year}\n"
+    if movie.rating and movie.rating > 0:
+        head += f"⭐ Reyting: {movie.rating}\n"
+    head += f"\n🔢 Kod: {movie.id}\n👁 Ko'rishlar: "
+    tail = f"\n\n✅ @{BOT_USERNAME.replace('@','')} | Filmlar olami 🍿"
+    return head, tail
+
+
+def render_keyboard(movie, is_favorite: bool):
+    """Kino ostidagi tugmalar (JSON ko'rinishida)"""
+    keyboard = types.InlineKeyboardMarkup(row_width=2)
+    # Birinchi qator: Sevimlilar tugmasi
+    keyboard.add(types.InlineKeyboardButton(
+        FAVORITE_REMOVE_TEXT if is_favorite else FAVORITE_ADD_TEXT, callback_data=f"fav_{movie.id}"
+    ))
+    # Ikkinchi qator: Ulashish va Qidirish tugmalari
+    keyboard.add(
+        types.InlineKeyboardButton("↪️ Ulashish", switch_inline_query=movie.title),
+        types.InlineKeyboardButton("🔎 Boshqa kinolar", switch_inline_query_current_chat="")
+    )
+    return keyboard.to_json()
+
+
+class MovieRenderCache:
+    """
+    Har bir kino uchun tayyor caption qismlari va ikkala holatdagi (sevimlilarda bor/yo'q) tugmalar.
+    Yuborishda faqat ko'rishlar soni qo'shiladi va kerakli tugmalar tanlanadi.
+    """
+
+    def __init__(self, maxsize: int = MOVIE_RENDER_CACHE_SIZE, ttl: float = MOVIE_RENDER_CACHE_TTL):
+        # {movie_id: (versiya, head, tail, (tugmalar JSON, sevimli), (tugmalar obyekt, sevimli))}
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def render(self, movie, views: int, is_favorite: bool):
+        """(caption, reply_markup JSON) - send_video uchun"""
+        head, tail, keyboards, _ = self._get_entry(movie)
+        return f"{head}{views}{tail}", keyboards[is_favorite]
+
+    def render_markup(self, movie, views: int, is_favorite: bool):
+        """(caption, InlineKeyboardMarkup) - inline natijalar uchun (ular obyektni kutadi)"""
+        head, tail, _, markups = self._get_entry(movie)
+        return f"{head}{views}{tail}", markups[is_favorite]
+
+    def get_keyboard(self, movie_id: int, is_favorite: bool):
+        """Keshdagi tugmalar (kino keshda bo'lmasa None)"""
+        entry = self.cache.get(movie_id)
+        return entry[3][is_favorite] if entry else None
+
+    def invalidate(self, movie_id: int):
+        self.cache.invalidate(movie_id)
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self):
+        return self.cache.stats()
+
+    def _get_entry(self, movie):
+        version = content_version(movie)
+        entry = self.cache.get(movie.id)
+        if entry is None or entry[0] != version:
+            head, tail = render_caption_parts(movie)
+            keyboards = (render_keyboard(movie, False), render_keyboard(movie, True))
+            markups = tuple(types.InlineKeyboardMarkup.de_json(keyboard) for keyboard in keyboards)
+            entry = (version, head, tail, keyboards, markups)
+            self.cache.set(movie.id, entry)
+        return entry[1:]
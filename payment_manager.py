@@ -2,6 +2,7 @@
 
 import json
 import logging
+import threading
 import time
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
@@ -9,13 +10,20 @@ from sqlalchemy import func
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import IntegrityError
 from database import Payment, PremiumUser, Settings, SessionLocal
-from config import DEFAULT_PREMIUM_PRICES, PAYMENT_CARD_INFO
+from ttl_cache import TTLCache
+from settings_cache import settings_cache
+from config import DEFAULT_PREMIUM_PRICES, PAYMENT_CARD_INFO, PREMIUM_CACHE_SIZE, PREMIUM_CACHE_TTL, PREMIUM_SWEEP_INTERVAL
 
 logger = logging.getLogger(__name__)
 
+_UNKNOWN = object()
+
 class PaymentManager:
     def __init__(self):
         self._init_settings()
+        # {user_id: expire_date yoki None} - premium bo'lmaganlar ham saqlanadi (None)
+        self.premium_cache = TTLCache(maxsize=PREMIUM_CACHE_SIZE, ttl=PREMIUM_CACHE_TTL)
+        self._sweeper_thread = None
 
     # get_db() funksiyasi olib tashlandi.
 
@@ -36,35 +44,21 @@ class PaymentManager:
                 db.execute(card_stmt)
 
                 db.commit()
+                settings_cache.reload()
             except Exception as e:
                 db.rollback()
                 logger.error(f"Boshlang'ich to'lov sozlamalarini yaratishda xatolik: {e}")
 
     def get_setting_value(self, key: str, default_value):
-        """Umumiy sozlamalarni olish uchun yordamchi funksiya"""
-        with SessionLocal() as db:
-            try:
-                value = db.query(Settings.value).filter(Settings.key == key).scalar()
-                return json.loads(value) if value else default_value
-            except (json.JSONDecodeError, Exception) as e:
-                logger.error(f"'{key}' sozlamasini olishda xatolik: {e}")
-                return default_value
+        """Umumiy sozlamalarni olish uchun yordamchi funksiya (jarayon bo'yicha umumiy keshdan)"""
+        return settings_cache.get_json(key, default_value)
 
     def update_setting_value(self, key: str, new_value_dict: dict):
         """Umumiy sozlamalarni yangilash uchun yordamchi funksiya"""
-        with SessionLocal() as db:
-            try:
-                db.query(Settings).filter(Settings.key == key).update(
-                    {Settings.value: json.dumps(new_value_dict)},
-                    synchronize_session=False
-                )
-                db.commit()
-                logger.info(f"'{key}' sozlamasi yangilandi.")
-                return True
-            except Exception as e:
-                db.rollback()
-                logger.error(f"'{key}' sozlamasini yangilashda xatolik: {e}")
-                return False
+        if settings_cache.update(key, json.dumps(new_value_dict)):
+            logger.info(f"'{key}' sozlamasi yangilandi.")
+            return True
+        return False
 
     def get_prices(self):
         return self.get_setting_value("premium_prices", DEFAULT_PREMIUM_PRICES)
@@ -145,6 +139,7 @@ class PaymentManager:
                 )
                 db.execute(update_stmt)
                 db.commit()
+                self.premium_cache.invalidate(payment.user_id)
 
                 logger.info(f"To'lov tasdiqlandi: ID {payment.id}, User {payment.user_id}")
                 return True, "Muvaffaqiyatli tasdiqlandi."
@@ -173,22 +168,69 @@ class PaymentManager:
                 return False, str(e)
 
     def is_premium_user(self, user_id: int):
+        """Premium obuna faolmi - keshdagi tugash vaqti bo'yicha (o'qish paytida bazaga yozilmaydi)"""
+        expire_date = self.get_premium_expiry(user_id)
+        return expire_date is not None and datetime.utcnow() < expire_date
+
+    def get_premium_expiry(self, user_id: int):
+        """Faol obunaning tugash vaqti yoki None"""
+        expire_date = self.premium_cache.get(user_id, _UNKNOWN)
+        if expire_date is not _UNKNOWN:
+            return expire_date
         with SessionLocal() as db:
             try:
-                premium_info = db.query(PremiumUser).filter(PremiumUser.user_id == user_id).first()
-                if not premium_info or not premium_info.is_active:
-                    return False
+                expire_date = db.query(PremiumUser.expire_date).filter(
+                    PremiumUser.user_id == user_id,
+                    PremiumUser.is_active == True
+                ).scalar()
+            except Exception as e:
+                logger.error(f"Premium tekshirishda xatolik (user_id: {user_id}): {e}")
+                return None
+        self.premium_cache.set(user_id, expire_date)
+        return expire_date
 
-                if datetime.utcnow() > premium_info.expire_date:
-                    premium_info.is_active = False
-                    db.commit()
-                    return False
+    def get_active_premium_user_ids(self):
+        """Obunasi hozir faol bo'lgan foydalanuvchilar ID lari (bitta so'rov)"""
+        with SessionLocal() as db:
+            try:
+                rows = db.query(PremiumUser.user_id).filter(
+                    PremiumUser.is_active == True,
+                    PremiumUser.expire_date > datetime.utcnow()
+                ).all()
+                return {user_id for (user_id,) in rows}
+            except Exception as e:
+                logger.error(f"Premium foydalanuvchilarni olishda xatolik: {e}")
+                return set()
 
-                return True
+    def deactivate_expired_premiums(self):
+        """Muddati tugagan barcha obunalarni bitta UPDATE bilan nofaol qilish"""
+        with SessionLocal() as db:
+            try:
+                expired = db.query(PremiumUser).filter(
+                    PremiumUser.is_active == True,
+                    PremiumUser.expire_date <= datetime.utcnow()
+                ).update({PremiumUser.is_active: False}, synchronize_session=False)
+                db.commit()
+                if expired:
+                    logger.info(f"{expired} ta premium obuna muddati tugagani uchun o'chirildi.")
+                return expired
             except Exception as e:
                 db.rollback()
-                logger.error(f"Premium tekshirishda xatolik (user_id: {user_id}): {e}")
-                return False
+                logger.error(f"Muddati tugagan obunalarni o'chirishda xatolik: {e}")
+                return 0
+
+    def start_premium_sweeper(self, interval: int = PREMIUM_SWEEP_INTERVAL):
+        """deactivate_expired_premiums ni har interval soniyada ishga tushiruvchi fon oqimi"""
+        if self._sweeper_thread is not None or interval <= 0:
+            return
+
+        def sweep_loop():
+            while True:
+                self.deactivate_expired_premiums()
+                time.sleep(interval)
+
+        self._sweeper_thread = threading.Thread(target=sweep_loop, name="premium-sweeper", daemon=True)
+        self._sweeper_thread.start()
 
     def get_premium_info(self, user_id: int):
         with SessionLocal() as db:
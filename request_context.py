@@ -0,0 +1,50 @@
+# request_context.py
+import logging
+from datetime import datetime
+
+from telebot.handler_backends import BaseMiddleware
+
+logger = logging.getLogger(__name__)
+
+
+class RequestContext:
+    """
+    Bitta yangilanish (update) uchun foydalanuvchi holati: ban, premium, majburiy a'zolik
+    va faol kanallar. Middleware tomonidan bir marta aniqlanadi, handlerlar faqat o'qiydi.
+    """
+
+    def __init__(self, user_id: int, is_banned: bool = False, premium_expiry: datetime = None,
+                 membership_required: bool = True, channels=()):
+        self.user_id = user_id
+        self.is_banned = is_banned
+        self.premium_expiry = premium_expiry  # Faol obuna tugash vaqti yoki None
+        self.membership_required = membership_required
+        self.channels = list(channels)  # Faol majburiy kanallar
+
+    @property
+    def is_premium(self):
+        return self.premium_expiry is not None and datetime.utcnow() < self.premium_expiry
+
+
+class RequestContextMiddleware(BaseMiddleware):
+    """Har bir xabar, callback va inline so'rov uchun RequestContext yaratib, handlerga ctx sifatida beradi"""
+
+    def __init__(self, user_manager, channel_manager, payment_manager):
+        super().__init__()
+        self.update_types = ['message', 'callback_query', 'inline_query']
+        self.user_manager = user_manager
+        self.channel_manager = channel_manager
+        self.payment_manager = payment_manager
+
+    def pre_process(self, update, data):
+        data['ctx'] = self.build(update.from_user.id)
+
+    def post_process(self, update, data, exception):
+        pass
+
+    def build(self, user_id: int):
+        # Hammasi keshlardan: odatiy holatda bazaga bitta ham so'rov yuborilmaydi
+        is_banned = self.user_manager.is_banned(user_id)
+        premium_expiry = self.payment_manager.get_premium_expiry(user_id)
+        membership_required, channels = self.channel_manager.get_gate_settings()
+        return RequestContext(user_id, is_banned, premium_expiry, membership_required, channels)
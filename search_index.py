@@ -0,0 +1,192 @@
+# search_index.py
+import heapq
+import logging
+from datetime import datetime
+from bisect import bisect_left, insort
+from threading import RLock
+
+from text_normalizer import normalize_text as normalize, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Qidiruv natijalarini tartiblash og'irliklari (SQL va xotiradagi qidiruv uchun umumiy).
+# Ko'rishlar soni bahoga kirmaydi: u sahifalar orasida o'zgaradi va keyset kursori qatorlarni tashlab/takrorlab yuboradi.
+EXACT_MATCH_BOOST = 2.0    # Nom so'rov bilan to'liq mos kelsa
+PREFIX_MATCH_BOOST = 1.0   # Nom so'rov bilan boshlansa
+
+
+class MovieSearchIndex:
+    """
+    Kinolar katalogi uchun xotiradagi teskari (inverted) indeks.
+    title, original_title va year tokenlaridan postinglar quriladi,
+    so'rovlar bazaga murojaat qilmasdan relevantlik bo'yicha javob beradi.
+    """
+
+    def __init__(self):
+        self.lock = RLock()
+        self._ready = False
+        self._movies = {}         # {movie_id: Movie}
+        self._views = {}          # {movie_id: views} - Movie obyektlari o'zgartirilmaydi
+        self._doc_tokens = {}     # {movie_id: set(tokens)}
+        self._doc_titles = {}     # {movie_id: (normalized_title, normalized_original_title)}
+        self._postings = {}       # {token: set(movie_id)}
+        self._vocabulary = []     # Prefiks qidiruvi uchun tartiblangan tokenlar
+        self._latest = []         # (added_date, movie_id) bo'yicha o'sish tartibida
+
+    def is_ready(self):
+        return self._ready
+
+    def build(self, movies):
+        """Indeksni noldan qurish (bot ishga tushganda)"""
+        with self.lock:
+            self._movies.clear()
+            self._views.clear()
+            self._doc_tokens.clear()
+            self._doc_titles.clear()
+            self._postings.clear()
+            self._latest = []
+            for movie in movies:
+                self._index_movie(movie)
+            self._vocabulary = sorted(self._postings)
+            self._latest.sort()
+            self._ready = True
+        logger.info(f"Qidiruv indeksi qurildi: {len(self._movies)} film, {len(self._vocabulary)} token")
+
+    def add(self, movie):
+        """Yangi (yoki o'zgargan) kinoni indeksga qo'shish"""
+        with self.lock:
+            if movie.id in self._movies:
+                self._unindex_movie(movie.id)
+            for token in self._index_movie(movie, sort_latest=True):
+                insort(self._vocabulary, token)
+
+    def remove(self, movie_id: int):
+        """Kinoni indeksdan olib tashlash"""
+        with self.lock:
+            self._unindex_movie(movie_id)
+
+    def increment_views(self, movie_id: int, delta: int = 1):
+        """Ko'rsatiladigan ko'rishlar sonini xotirada ham yangilash"""
+        with self.lock:
+            if movie_id in self._views:
+                self._views[movie_id] += delta
+
+    def get(self, movie_id: int):
+        return self._movies.get(movie_id)
+
+    def get_views(self, movie_id: int):
+        """Indeksdagi ko'rishlar soni (bazaga hali yozilmaganlari bilan); kino indeksda bo'lmasa None"""
+        return self._views.get(movie_id)
+
+    def search(self, query: str, limit: int = 50, after: tuple = None):
+        """
+        So'rovga mos kinolarni relevantlik bo'yicha qaytarish.
+        Natija: (kino, tartiblash_kaliti) juftliklari; after - oldingi sahifaning oxirgi kaliti (keyset).
+        Bo'sh so'rovda kalit (added_date, id), aks holda (score, id).
+        """
+        normalized_query = normalize(query)
+        with self.lock:
+            if not normalized_query:
+                end = bisect_left(self._latest, after) if after else len(self._latest)
+                start = max(end - limit, 0)
+                return [(self._movies[key[1]], key) for key in reversed(self._latest[start:end])]
+
+            if normalized_query.isdigit() and after is None:
+                movie = self._movies.get(int(normalized_query))
+                if movie is not None:
+                    return [(movie, (0.0, movie.id))]
+
+            candidates = self._match(normalized_query.split())
+            if not candidates:
+                return []
+
+            scored = ((self._score(movie_id, normalized_query), movie_id) for movie_id in candidates)
+            if after is not None:
+                scored = (key for key in scored if key < after)
+            return [(self._movies[key[1]], key) for key in heapq.nlargest(limit, scored)]
+
+    # --- Ichki yordamchi funksiyalar ---
+
+    def _index_movie(self, movie, sort_latest: bool = False):
+        tokens = set(tokenize(movie.title)) | set(tokenize(movie.original_title)) | set(tokenize(movie.year))
+        new_tokens = []
+        for token in tokens:
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = set()
+                new_tokens.append(token)
+            posting.add(movie.id)
+
+        self._movies[movie.id] = movie
+        self._views[movie.id] = movie.views or 0
+        self._doc_tokens[movie.id] = tokens
+        self._doc_titles[movie.id] = (normalize(movie.title), normalize(movie.original_title))
+        latest_key = self._latest_key(movie)
+        if sort_latest:
+            insort(self._latest, latest_key)
+        else:
+            self._latest.append(latest_key)
+        return new_tokens
+
+    def _unindex_movie(self, movie_id: int):
+        movie = self._movies.pop(movie_id, None)
+        if movie is None:
+            return
+        self._views.pop(movie_id, None)
+        for token in self._doc_tokens.pop(movie_id, ()):
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            posting.discard(movie_id)
+            if not posting:
+                del self._postings[token]
+                position = bisect_left(self._vocabulary, token)
+                if position < len(self._vocabulary) and self._vocabulary[position] == token:
+                    del self._vocabulary[position]
+        self._doc_titles.pop(movie_id, None)
+        latest_key = self._latest_key(movie)
+        position = bisect_left(self._latest, latest_key)
+        if position < len(self._latest) and self._latest[position] == latest_key:
+            del self._latest[position]
+
+    @staticmethod
+    def _latest_key(movie):
+        return (movie.added_date or datetime.min, movie.id)
+
+    def _prefix_postings(self, prefix: str):
+        """prefix bilan boshlanadigan barcha tokenlarning postinglari birlashmasi"""
+        matched = set()
+        position = bisect_left(self._vocabulary, prefix)
+        while position < len(self._vocabulary) and self._vocabulary[position].startswith(prefix):
+            matched |= self._postings[self._vocabulary[position]]
+            position += 1
+        return matched
+
+    def _match(self, query_tokens):
+        """
+        Barcha so'rov tokenlari mos kelgan kinolar (AND).
+        Oxirgi token yozilish jarayonida bo'lgani uchun prefiks sifatida qidiriladi.
+        """
+        candidates = None
+        for index, token in enumerate(query_tokens):
+            is_last = index == len(query_tokens) - 1
+            if is_last:
+                matched = self._prefix_postings(token)
+            else:
+                matched = self._postings.get(token) or self._prefix_postings(token)
+            candidates = matched if candidates is None else candidates & matched
+            if not candidates:
+                return set()
+        return candidates
+
+    def _score(self, movie_id: int, normalized_query: str):
+        title, original_title = self._doc_titles[movie_id]
+        score = 0.0
+        if normalized_query in (title, original_title):
+            score += EXACT_MATCH_BOOST
+        if title.startswith(normalized_query) or original_title.startswith(normalized_query):
+            score += PREFIX_MATCH_BOOST
+        query_tokens = normalized_query.split()
+        doc_tokens = self._doc_tokens[movie_id]
+        score += sum(1 for token in query_tokens if token in doc_tokens) / (len(doc_tokens) or 1)
+        return score
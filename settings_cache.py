@@ -0,0 +1,129 @@
+# settings_cache.py
+import json
+import logging
+import time
+from threading import Lock
+
+from sqlalchemy import Integer, Text, cast
+from sqlalchemy.exc import IntegrityError
+
+from database import Settings, SessionLocal
+from config import SETTINGS_VERSION_CHECK_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "settings_version"  # Har bir o'zgarishda oshadi - boshqa jarayonlar shu orqali bilib oladi
+
+
+class SettingsCache:
+    """
+    settings jadvalining jarayon bo'yicha umumiy keshi.
+    Barcha qatorlar bir marta o'qiladi; o'zgartirishda settings_version qiymati shu tranzaksiyada oshiriladi,
+    boshqa jarayonlar esa versiyani SETTINGS_VERSION_CHECK_INTERVAL soniyada bir tekshirib, kerak bo'lsa qayta yuklaydi.
+    """
+
+    def __init__(self, check_interval: float = SETTINGS_VERSION_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self.lock = Lock()
+        self._values = {}   # {key: value (matn)}
+        self._parsed = {}   # {key: json.loads(value)}
+        self._version = None
+        self._checked_at = 0.0
+
+    def get(self, key: str, default=None):
+        self._ensure_fresh()
+        return self._values.get(key, default)
+
+    def get_json(self, key: str, default=None):
+        """JSON ko'rinishidagi sozlama (har safar qayta parse qilinmaydi)"""
+        self._ensure_fresh()
+        with self.lock:
+            if key in self._parsed:
+                return self._parsed[key]
+            value = self._values.get(key)
+            if not value:
+                return default
+            try:
+                parsed = json.loads(value)
+            except json.JSONDecodeError as e:
+                logger.error(f"'{key}' sozlamasini o'qishda xatolik: {e}")
+                return default
+            self._parsed[key] = parsed
+            return parsed
+
+    def update(self, key: str, value: str):
+        """Sozlamani saqlash (yo'q bo'lsa qo'shiladi) va versiyani oshirish"""
+        with SessionLocal() as db:
+            try:
+                updated = db.query(Settings).filter(Settings.key == key).update(
+                    {Settings.value: value}, synchronize_session=False
+                )
+                if not updated:
+                    db.add(Settings(key=key, value=value))
+                self.bump_version(db)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"'{key}' sozlamasini saqlashda xatolik: {e}")
+                return False
+        self.reload()
+        return True
+
+    def bump_version(self, db):
+        """Joriy tranzaksiyada versiyani oshirish (commit chaqiruvchida, keyin reload())"""
+        db.query(Settings).filter(Settings.key == VERSION_KEY).update(
+            {Settings.value: cast(cast(Settings.value, Integer) + 1, Text)}, synchronize_session=False
+        )
+
+    def reload(self):
+        """Barcha sozlamalarni bazadan qayta o'qish"""
+        with SessionLocal() as db:
+            try:
+                rows = dict(db.query(Settings.key, Settings.value).all())
+            except Exception as e:
+                logger.error(f"Sozlamalarni yuklashda xatolik: {e}")
+                return False
+        if VERSION_KEY not in rows:
+            self._create_version_row()
+            rows[VERSION_KEY] = "0"
+        with self.lock:
+            self._values = rows
+            self._parsed = {}
+            self._version = rows[VERSION_KEY]
+            self._checked_at = time.monotonic()
+        return True
+
+    # --- Ichki yordamchi funksiyalar ---
+
+    def _ensure_fresh(self):
+        if self._version is None:
+            self.reload()
+            return
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return
+        # Faqat versiya o'qiladi; o'zgargan bo'lsa barcha sozlamalar qayta yuklanadi
+        self._checked_at = time.monotonic()
+        with SessionLocal() as db:
+            try:
+                version = db.query(Settings.value).filter(Settings.key == VERSION_KEY).scalar()
+            except Exception as e:
+                logger.error(f"Sozlamalar versiyasini tekshirishda xatolik: {e}")
+                return
+        if version != self._version:
+            logger.info("Sozlamalar boshqa jarayonda o'zgargan, qayta yuklanmoqda.")
+            self.reload()
+
+    def _create_version_row(self):
+        with SessionLocal() as db:
+            try:
+                db.add(Settings(key=VERSION_KEY, value="0"))
+                db.commit()
+            except IntegrityError:
+                db.rollback()  # Boshqa jarayon allaqachon yaratgan
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Sozlamalar versiyasini yaratishda xatolik: {e}")
+
+
+# Jarayon bo'yicha yagona nusxa (ChannelManager va PaymentManager birgalikda ishlatadi)
+settings_cache = SettingsCache()
@@ -0,0 +1,76 @@
+# text_normalizer.py
+import re
+import unicodedata
+
+# Kirill (o'zbek va rus) harflarini lotinga o'girish jadvali.
+# O'zbek lotin imlosiga mos: ш -> sh, ч -> ch, ў -> o', ғ -> g', х -> x, ҳ -> h.
+_CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'ғ': "g'", 'д': 'd', 'е': 'e', 'ё': 'yo',
+    'ж': 'j', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'қ': 'q', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'ў': "o'", 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'x', 'ҳ': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sh', 'ъ': "'",
+    'ь': '', 'ы': 'i', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+
+# Turkcha/eski yozuvdagi lotin harflari (ş, ç, ğ ...) o'zbek lotin imlosiga
+_LATIN_VARIANTS = {
+    'ş': 'sh', 'ç': 'ch', 'ğ': 'g', 'ı': 'i', 'ö': 'o', 'ü': 'u', 'ñ': 'ng',
+}
+
+# Rus tilidan lotin transliteratsiyasidagi harf birikmalari o'zbekcha shaklga
+_LATIN_DIGRAPHS = [
+    ('shch', 'sh'),
+    ('kh', 'x'),
+    ('zh', 'j'),
+]
+
+_APOSTROPHES = re.compile(r"[’‘ʻʼ`´']")
+_NON_WORD = re.compile(r"[\W_]+")
+_WORD_START_YE = re.compile(r"(^|[\W_])е")
+
+# search_key ustunida nom va asl nomni ajratuvchi (normallashtirilgan matnda uchramaydi)
+SEARCH_KEY_SEPARATOR = " | "
+
+def transliterate(text: str):
+    """Kirill yozuvini o'zbek lotin yozuviga o'girish"""
+    # O'zbek imlosida so'z boshidagi "е" -> "ye" (Ер -> Yer)
+    text = _WORD_START_YE.sub(lambda match: match.group(1) + 'ye', text)
+    return "".join(_CYRILLIC_TO_LATIN.get(ch, ch) for ch in text)
+
+def normalize_text(text: str):
+    """
+    Matnni yozuvdan qat'i nazar yagona qidiruv shakliga keltirish:
+    kichik harf, kirill -> lotin, apostroflarsiz (o'/oʻ/o` -> o), rus transliteratsiyasi
+    (kh -> x, zh -> j), diakritik belgilarsiz, faqat harf/raqam va bitta bo'sh joy.
+    """
+    if not text:
+        return ""
+    text = transliterate(text.lower())
+    text = "".join(_LATIN_VARIANTS.get(ch, ch) for ch in text)
+    text = unicodedata.normalize('NFKD', text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = _APOSTROPHES.sub("", text)
+    for source, target in _LATIN_DIGRAPHS:
+        text = text.replace(source, target)
+    return _NON_WORD.sub(" ", text).strip()
+
+def tokenize(text: str):
+    return normalize_text(text).split()
+
+def build_search_key(title: str, original_title: str = None):
+    """Movie.search_key qiymati: normallashtirilgan nom va asl nom"""
+    title_key, original_key = normalize_text(title), normalize_text(original_title)
+    if not original_key or original_key == title_key:
+        return title_key
+    return SEARCH_KEY_SEPARATOR.join(key for key in (title_key, original_key) if key)
+
+def split_genres(genres_text: str):
+    """Vergul bilan ajratilgan janrlar matnini takrorlanmas nomlar ro'yxatiga aylantirish"""
+    if not genres_text:
+        return []
+    genres = []
+    for genre in genres_text.split(','):
+        genre = genre.strip()
+        if genre and genre not in genres:
+            genres.append(genre)
+    return genres
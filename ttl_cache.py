@@ -0,0 +1,65 @@
+# ttl_cache.py
+import time
+from collections import OrderedDict
+from threading import Lock
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    Hajmi cheklangan LRU + TTL kesh (thread-safe).
+    Eng uzoq ishlatilmagan yozuvlar maxsize oshganda, eskirganlari esa ttl soniyadan keyin chiqariladi.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = Lock()
+        self._data = OrderedDict()  # {key: (expire_at, value)}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expire_at, value = entry
+            if expire_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        expire_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            self._data[key] = (expire_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Keshdan foydalanish statistikasi"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0
+            }
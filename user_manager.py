@@ -1,51 +1,148 @@
 # user_manager.py (YAKUNIY VARIANT)
 
 import logging
+import threading
 from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, or_
 from sqlalchemy.dialects.postgresql import insert
 from database import User, SessionLocal
+from ttl_cache import TTLCache
+from counter_buffer import CounterBuffer, bulk_increment
+from config import (
+    BAN_CACHE_SIZE, BAN_CACHE_TTL, USER_FLUSH_INTERVAL, USER_FLUSH_MAX_PENDING, USER_WRITE_CHUNK_SIZE, USER_PENDING_LIMIT
+)
 
 logger = logging.getLogger(__name__)
 
+PROFILE_FIELDS = ('username', 'first_name', 'last_name')
+_UNCHANGED = object()  # Profil maydoni berilmagan (faqat last_seen yangilanadi)
+
 class UserManager:
     def __init__(self):
-        pass
+        # {user_id: is_banned} - har bir so'rovda tekshiriladi, lekin deyarli o'zgarmaydi
+        self.ban_cache = TTLCache(maxsize=BAN_CACHE_SIZE, ttl=BAN_CACHE_TTL)
+        # Bazaga hali yozilmagan upsertlar: {user_id: {'last_seen': ..., [profil maydonlari]}}
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._flusher_thread = None
+        # Ko'rilgan filmlar soni: {user_id: delta}, foydalanuvchilar navbati bilan birga yoziladi
+        self.watch_counter = CounterBuffer()
 
     # get_db() funksiyasi olib tashlandi.
 
-    def add_user(self, user_id: int, username: str = None, first_name: str = None, last_name: str = None):
-        with SessionLocal() as db:
-            try:
-                # "INSERT ... ON CONFLICT DO UPDATE" dan foydalanamiz (upsert)
-                # Bu bitta so'rovda ham qo'shish, ham yangilashni bajaradi.
-                stmt = insert(User).values(
-                    user_id=user_id,
-                    username=username,
-                    first_name=first_name,
-                    last_name=last_name,
-                    last_seen=datetime.utcnow() # Har doim last_seen yangilanadi
-                )
+    def add_user(self, user_id: int, username=_UNCHANGED, first_name=_UNCHANGED, last_name=_UNCHANGED):
+        """
+        Foydalanuvchini qo'shish/yangilash darhol bazaga yozilmaydi: navbatda har bir user_id uchun
+        eng oxirgi qiymatlar saqlanadi va fon oqimi ularni bitta ko'p qatorli upsert bilan yozadi.
+        Profil maydonlari berilmasa, faqat last_seen yangilanadi.
+        """
+        entry = {'last_seen': datetime.utcnow()}
+        if username is not _UNCHANGED or first_name is not _UNCHANGED or last_name is not _UNCHANGED:
+            entry.update(
+                username=None if username is _UNCHANGED else username,
+                first_name=None if first_name is _UNCHANGED else first_name,
+                last_name=None if last_name is _UNCHANGED else last_name,
+            )
+        with self._pending_lock:
+            self._pending.setdefault(user_id, {}).update(entry)
+            pending_count = len(self._pending)
+        if self._flusher_thread is None:
+            return self.flush_pending_users() > 0 # Fon oqimi ishlamayapti - darhol yozamiz
+        if pending_count >= USER_FLUSH_MAX_PENDING:
+            self._flush_event.set()
+        return True
 
-                update_stmt = stmt.on_conflict_do_update(
-                    index_elements=['user_id'],
-                    set_={
-                        'username': stmt.excluded.username,
-                        'first_name': stmt.excluded.first_name,
-                        'last_name': stmt.excluded.last_name,
-                        'last_seen': stmt.excluded.last_seen
-                    }
-                )
+    def ensure_user_persisted(self, user_id: int):
+        """
+        Foydalanuvchi qatorini darhol upsert qilish (sevimlilar, to'lovlar kabi bog'liq yozuvlardan oldin).
+        Navbatda bo'lmasa ham yoziladi: fon oqimi uni olib, hali commit qilmagan yoki
+        xatolikdan keyin navbatga qaytarmagan bo'lishi mumkin.
+        """
+        with self._pending_lock:
+            entry = self._pending.pop(user_id, None)
+        return self._write_users({user_id: entry or {'last_seen': datetime.utcnow()}})
+
+    def flush_pending_users(self):
+        """Navbatdagi barcha upsertlarni bazaga yozish; yozilgan foydalanuvchilar sonini qaytaradi"""
+        with self._pending_lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        return len(batch) if self._write_users(batch) else 0
+
+    def get_pending_users_count(self):
+        return len(self._pending)
+
+    def start_user_flusher(self, interval: float = USER_FLUSH_INTERVAL):
+        """Navbatni har interval soniyada (yoki USER_FLUSH_MAX_PENDING ga yetganda) yozuvchi fon oqimi"""
+        if self._flusher_thread is not None or interval <= 0:
+            return
+
+        def flush_loop():
+            while True:
+                self._flush_event.wait(interval)
+                self._flush_event.clear()
+                self.flush_pending_users()
+                self.flush_watch_counts() # Foydalanuvchilar yozilgandan keyin - yangi qatorlar ham yangilanadi
+
+        self._flusher_thread = threading.Thread(target=flush_loop, name="user-flusher", daemon=True)
+        self._flusher_thread.start()
 
-                db.execute(update_stmt)
+    def _write_users(self, batch: dict):
+        """
+        Bitta tranzaksiyada ko'p qatorli "INSERT ... ON CONFLICT DO UPDATE" (USER_WRITE_CHUNK_SIZE qatordan).
+        Profil bilan kelganlar va faqat last_seen yangilanadiganlar alohida so'rov bilan yoziladi.
+        Xatolik bo'lsa yozuvlar navbatga qaytariladi (yangiroq qiymatlar ustidan yozilmaydi).
+        """
+        profile_rows, seen_rows = [], []
+        for user_id in sorted(batch): # Tartib - parallel jarayonlar orasida deadlock bo'lmasligi uchun
+            row = dict(batch[user_id], user_id=user_id)
+            (profile_rows if 'first_name' in row else seen_rows).append(row)
+
+        with SessionLocal() as db:
+            try:
+                for start in range(0, len(profile_rows), USER_WRITE_CHUNK_SIZE):
+                    stmt = insert(User).values(profile_rows[start:start + USER_WRITE_CHUNK_SIZE])
+                    db.execute(stmt.on_conflict_do_update(
+                        index_elements=['user_id'],
+                        set_={field: stmt.excluded[field] for field in PROFILE_FIELDS + ('last_seen',)}
+                    ))
+                for start in range(0, len(seen_rows), USER_WRITE_CHUNK_SIZE):
+                    stmt = insert(User).values(seen_rows[start:start + USER_WRITE_CHUNK_SIZE])
+                    db.execute(stmt.on_conflict_do_update(
+                        index_elements=['user_id'],
+                        set_={'last_seen': stmt.excluded.last_seen}
+                    ))
                 db.commit()
-                # logger.info(f"Foydalanuvchi ma'lumotlari yangilandi/qo'shildi: {user_id}")
                 return True
             except Exception as e:
                 db.rollback()
-                logger.error(f"Foydalanuvchi qo'shish/yangilashda xatolik: {e}")
-                return False
+                logger.error(f"Foydalanuvchilarni ({len(batch)} ta) yozishda xatolik: {e}")
+
+        self._requeue_users(batch)
+        return False
+
+    def _requeue_users(self, batch: dict):
+        """
+        Yozilmagan yozuvlarni navbatga qaytarish. Navbat USER_PENDING_LIMIT dan oshmaydi:
+        joy yetmasa avval profil bilan kelganlar saqlanadi, faqat last_seen yangilanadiganlar tashlab yuboriladi.
+        """
+        dropped = 0
+        with self._pending_lock:
+            room = USER_PENDING_LIMIT - len(self._pending)
+            for user_id, entry in sorted(batch.items(), key=lambda item: 'first_name' not in item[1]):
+                newer = self._pending.get(user_id)
+                if newer:
+                    self._pending[user_id] = {**entry, **newer}
+                elif room > 0:
+                    self._pending[user_id] = entry
+                    room -= 1
+                else:
+                    dropped += 1
+        if dropped:
+            logger.error(f"Foydalanuvchilar navbati to'lgan ({USER_PENDING_LIMIT}): {dropped} ta yozuv tashlab yuborildi")
 
     def get_user(self, user_id: int):
         with SessionLocal() as db:
@@ -56,32 +153,68 @@ class UserManager:
                 return None
 
     def increment_movie_watch(self, user_id: int):
+        self.watch_counter.add(user_id)
+
+    def flush_watch_counts(self):
+        """
+        Yig'ilgan tomoshalarni bitta bulk UPDATE bilan yozish; yangilangan foydalanuvchilar sonini qaytaradi.
+        Avval navbatdagi foydalanuvchilar yoziladi. Qatori topilmagan deltalar, agar foydalanuvchi hali
+        yozilishini kutayotgan bo'lsa, keyingi safar uchun qaytariladi.
+        """
+        if not len(self.watch_counter):
+            return 0
+        self.flush_pending_users()
+        deltas = self.watch_counter.drain()
+        if not deltas:
+            return 0
         with SessionLocal() as db:
             try:
-                # To'g'ridan-to'g'ri UPDATE so'rovi
-                db.query(User).filter(User.user_id == user_id).update(
-                    {User.movies_watched: User.movies_watched + 1},
-                    synchronize_session=False
-                )
+                updated = set(bulk_increment(db, User, User.user_id, User.movies_watched, deltas))
                 db.commit()
             except Exception as e:
                 db.rollback()
+                self.watch_counter.restore(deltas)
                 logger.error(f"Film ko'rishni yangilashda xatolik: {e}")
+                return 0
+
+        missing = {user_id: delta for user_id, delta in deltas.items() if user_id not in updated}
+        if missing:
+            with self._pending_lock:
+                waiting = {user_id: delta for user_id, delta in missing.items() if user_id in self._pending}
+            self.watch_counter.restore(waiting)
+            if len(waiting) < len(missing):
+                logger.warning(f"Film ko'rishlar: {len(missing) - len(waiting)} ta foydalanuvchi bazada topilmadi")
+        return len(updated)
 
     def is_banned(self, user_id: int):
+        cached = self.ban_cache.get(user_id)
+        if cached is not None:
+            return cached
         with SessionLocal() as db:
             try:
                 # Faqat kerakli ustunni olamiz, bu ancha tez
-                is_banned_status = db.query(User.is_banned).filter(User.user_id == user_id).scalar()
-                return is_banned_status or False
+                is_banned_status = bool(db.query(User.is_banned).filter(User.user_id == user_id).scalar())
+                self.ban_cache.set(user_id, is_banned_status)
+                return is_banned_status
             except Exception as e:
                 logger.error(f"Ban statusini tekshirishda xatolik: {e}")
                 return False # Xavfsizlik uchun, xatolik bo'lsa ban qilinmagan deb hisoblaymiz
 
-    def get_all_user_ids(self):
+    def get_all_user_ids(self, after_user_id: int = None, max_user_id: int = None, joined_before: datetime = None):
+        """
+        Ban qilinmagan foydalanuvchilar; after_user_id < ID <= max_user_id va joined_before gacha qo'shilganlar
+        (broadcastni davom ettirish uchun)
+        """
         with SessionLocal() as db:
             try:
-                user_ids = db.query(User.user_id).filter(User.is_banned == False).all()
+                query = db.query(User.user_id).filter(User.is_banned == False)
+                if after_user_id is not None:
+                    query = query.filter(User.user_id > after_user_id)
+                if max_user_id is not None:
+                    query = query.filter(User.user_id <= max_user_id)
+                if joined_before is not None:
+                    query = query.filter(or_(User.joined_date.is_(None), User.joined_date <= joined_before))
+                user_ids = query.all()
                 return [uid for (uid,) in user_ids]
             except Exception as e:
                 logger.error(f"Barcha foydalanuvchi ID larini olishda xatolik: {e}")
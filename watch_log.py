@@ -0,0 +1,136 @@
+# watch_log.py
+import io
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+
+from database import WatchEvent, SessionLocal, engine, ensure_watch_event_partitions
+from config import WATCH_LOG_QUEUE_SIZE, WATCH_LOG_BATCH_SIZE, WATCH_LOG_FLUSH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+WATCH_SOURCES = ('inline', 'code', 'deeplink', 'favorites')
+
+COPY_SQL = "COPY watch_events (ts, user_id, movie_id, source) FROM STDIN"
+
+
+class WatchEventLog:
+    """
+    Ko'rishlar jurnali: send_movie hodisalarni navbatga qo'yadi (bazaga murojaatsiz),
+    fon oqimi esa ularni guruhlab COPY (psycopg2) yoki executemany bilan watch_events ga yozadi.
+    """
+
+    def __init__(self, max_queue: int = WATCH_LOG_QUEUE_SIZE, batch_size: int = WATCH_LOG_BATCH_SIZE):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.lock = threading.Lock()  # Bir vaqtda faqat bitta yozuvchi (fon oqimi yoki shutdown)
+        self.written = 0
+        self.dropped = 0
+        self._partition_month = None
+        self._writer_thread = None
+
+    def record(self, user_id: int, movie_id: int, source: str):
+        """Hodisani navbatga qo'shish; navbat to'lgan bo'lsa hodisa tashlab yuboriladi (bot sekinlashmaydi)"""
+        try:
+            self.queue.put_nowait((datetime.utcnow(), user_id, movie_id, source))
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """
+        Navbatdagi barcha hodisalarni batch_size lik guruhlarda yozish; yozilganlar sonini qaytaradi.
+        Yozib bo'lmasa guruh navbatga qaytariladi va qolganlari keyingi safarga qoldiriladi.
+        """
+        total = 0
+        with self.lock:
+            self._ensure_partitions()
+            while True:
+                rows = self._take_batch()
+                if not rows:
+                    break
+                if not self._write(rows):
+                    self._requeue(rows)
+                    break
+                total += len(rows)
+                if len(rows) < self.batch_size:
+                    break
+        self.written += total
+        return total
+
+    def get_stats(self):
+        return {"pending": self.queue.qsize(), "written": self.written, "dropped": self.dropped}
+
+    def start_writer(self, interval: float = WATCH_LOG_FLUSH_INTERVAL):
+        """Navbatni har interval soniyada yozuvchi fon oqimi"""
+        if self._writer_thread is not None or interval <= 0:
+            return
+
+        def write_loop():
+            while True:
+                time.sleep(interval)
+                self.flush()
+
+        self._writer_thread = threading.Thread(target=write_loop, name="watch-log-writer", daemon=True)
+        self._writer_thread.start()
+
+    # --- Ichki yordamchi funksiyalar ---
+
+    def _take_batch(self):
+        rows = []
+        while len(rows) < self.batch_size:
+            try:
+                rows.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _requeue(self, rows):
+        """Yozilmagan hodisalarni navbatga qaytarish (navbat hajmidan oshganlari tashlab yuboriladi)"""
+        for index, row in enumerate(rows):
+            try:
+                self.queue.put_nowait(row)
+            except queue.Full:
+                self.dropped += len(rows) - index
+                logger.warning(f"Ko'rishlar jurnali navbati to'lgan: {len(rows) - index} ta hodisa tashlab yuborildi")
+                break
+
+    def _ensure_partitions(self):
+        # Oy almashganda keyingi oylar uchun bo'laklar oldindan yaratiladi
+        month = datetime.utcnow().strftime('%Y-%m')
+        if month != self._partition_month:
+            ensure_watch_event_partitions()
+            self._partition_month = month
+
+    def _write(self, rows):
+        try:
+            if engine.dialect.driver == "psycopg2":
+                self._copy(rows)
+            else:
+                with SessionLocal() as db:
+                    db.bulk_insert_mappings(WatchEvent, [
+                        {"ts": ts, "user_id": user_id, "movie_id": movie_id, "source": source}
+                        for ts, user_id, movie_id, source in rows
+                    ])
+                    db.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Ko'rishlar jurnaliga yozishda xatolik ({len(rows)} ta hodisa): {e}")
+            return False
+
+    def _copy(self, rows):
+        buffer = io.StringIO()
+        for ts, user_id, movie_id, source in rows:
+            buffer.write(f"{ts.isoformat()}\t{user_id}\t{movie_id}\t{source}\n")
+        buffer.seek(0)
+        connection = engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.copy_expert(COPY_SQL, buffer)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()